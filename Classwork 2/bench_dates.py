@@ -0,0 +1,70 @@
+"""
+Benchmark of date_converter against the old strptime implementation.
+
+    python bench_dates.py [--count 200000] [--distinct 5000] [--invalid 0.1]
+
+Dates are drawn from --distinct different values in all three formats,
+with a share of invalid strings. Prints the time and dates per second of
+convert_date_slow, convert_date without and with a warm cache, and
+convert_dates; all results are checked against convert_date_slow.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from date_converter import convert_date, convert_date_slow, convert_dates
+
+FORMATS = ["%d.%m.%Y", "%Y-%m-%d", "%m/%Y/%d"]
+INVALID = ["", "hello", "31.02.2024", "2024-13-01", "1/2024/1/", "29.01.25"]
+
+
+def make_dates(count: int, distinct: int, invalid: float):
+    start = date(1990, 1, 1)
+    pool = [(start + timedelta(days=random.randrange(20000))).strftime(random.choice(FORMATS))
+            for _ in range(distinct)]
+    return [random.choice(INVALID) if random.random() < invalid else random.choice(pool)
+            for _ in range(count)]
+
+
+def run(name: str, fn, dates, expected):
+    t = time.perf_counter()
+    result = fn(dates)
+    elapsed = time.perf_counter() - t
+    assert result == expected, f"{name}: results differ"
+    print(f"  {name:<28} {elapsed:8.3f} s  {len(dates) / elapsed:12.0f} dates/s")
+    return elapsed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="convert_date benchmark")
+    ap.add_argument("--count", type=int, default=200000)
+    ap.add_argument("--distinct", type=int, default=5000)
+    ap.add_argument("--invalid", type=float, default=0.1, help="share of invalid strings")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    random.seed(args.seed)
+    dates = make_dates(args.count, args.distinct, args.invalid)
+    print(f"{args.count} dates, {args.distinct} distinct, {args.invalid:.0%} invalid")
+
+    expected = [convert_date_slow(d) for d in dates]
+    slow = run("strptime (old)", lambda ds: [convert_date_slow(d) for d in ds], dates, expected)
+
+    convert_date.cache_clear()
+    # Every date once: no help from the cache
+    fresh = list(dict.fromkeys(dates))
+    run("convert_date, all distinct", lambda ds: [convert_date(d) for d in ds], fresh,
+        [convert_date_slow(d) for d in fresh])
+
+    convert_date.cache_clear()
+    run("convert_date, cold cache", lambda ds: [convert_date(d) for d in ds], dates, expected)
+    fast = run("convert_date, warm cache", lambda ds: [convert_date(d) for d in ds],
+               dates, expected)
+    convert_date.cache_clear()
+    run("convert_dates (batch)", convert_dates, dates, expected)
+    print(f"  speedup (warm cache): {slow / fast:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
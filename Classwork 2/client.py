@@ -1,5 +1,8 @@
 import socket
 import logging
+import sys
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -8,36 +11,99 @@ SHOST = "localhost"
 SPORT = 8888
 BUFSIZE = 10
 
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s.connect((SHOST, SPORT))
-logging.info(f"Connected to server {SHOST}:{SPORT}")
+# Batch mode (see server.py): dates go one per line without waiting for
+# answers, the answers come back as lines in the same order
+BATCH_HEADER = b"BATCH\n"
+IO_BUFFER = 1024 * 1024
 
-inputfile = input("Input file with dates: ")
-outfile = input("Input file to output: ")
 
-with open(inputfile, "r", encoding="utf-8") as f:
-    logger.info("Starting reading file")
+def convert_single(s: socket.socket, inputfile: str, outfile: str):
+    """Old mode: one round trip per date."""
+    with open(inputfile, "r", encoding="utf-8") as f:
+        logger.info("Starting reading file")
 
-    out = open(outfile, "w")
-    for line in f.readlines():
-        date = line.replace("\n", "").strip()
+        out = open(outfile, "w")
+        for line in f.readlines():
+            date = line.replace("\n", "").strip()
 
-        if not date:
-            continue
+            if not date:
+                continue
 
-        s.send(bytes(date, encoding="utf-8"))
-        logger.info(f"Sended to server: {date}")
+            s.send(bytes(date, encoding="utf-8"))
+            logger.info(f"Sended to server: {date}")
 
-        converted = s.recv(BUFSIZE).strip().decode()
-        if converted:
-            logger.info(f"Converted: {date} -> {converted}")
-            out.write(f"{converted}\n")
-        else:
-            logger.warning("Empty bytes from server")
+            converted = s.recv(BUFSIZE).strip().decode()
+            if converted:
+                logger.info(f"Converted: {date} -> {converted}")
+                out.write(f"{converted}\n")
+            else:
+                logger.warning("Empty bytes from server")
 
-    out.close()
-    logger.info("Ended reading file")
+        out.close()
+        logger.info("Ended reading file")
 
-s.send(b"CLOSE".ljust(BUFSIZE))
-s.close()
-logger.info("Disconected from server")
+    s.send(b"CLOSE".ljust(BUFSIZE))
+
+
+def send_dates(s: socket.socket, f, errors: list):
+    """Streams the whole file to the server, then closes our side."""
+    try:
+        with s.makefile("wb", buffering=IO_BUFFER) as wfile:
+            wfile.write(BATCH_HEADER)
+            while lines := f.readlines(IO_BUFFER):
+                wfile.write(b"".join(line.strip() + b"\n" for line in lines if line.strip()))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        # Without it the server and our reader would wait forever
+        try:
+            s.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+def convert_batch(s: socket.socket, inputfile: str, outfile: str):
+    """Batch mode: a separate thread sends while this one reads the answers."""
+    start = time.perf_counter()
+    # Opened here, so a wrong path fails before anything is sent
+    with open(inputfile, "rb") as f, open(outfile, "w", encoding="utf-8") as out:
+        errors = []
+        sender = threading.Thread(target=send_dates, args=(s, f, errors))
+        sender.start()
+
+        count = failed = 0
+        with s.makefile("rb", buffering=IO_BUFFER) as rfile:
+            while lines := rfile.readlines(IO_BUFFER):
+                converted = [line.strip().decode() for line in lines]
+                out.writelines(f"{date}\n" for date in converted if date)
+                count += len(converted)
+                failed += converted.count("")
+        sender.join()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - start
+    if failed:
+        logger.warning(f"{failed} dates were not recognized")
+    logger.info(f"Converted {count} dates in {elapsed:.2f} s "
+                f"({count / elapsed if elapsed else 0:.0f} dates/s)")
+
+
+if __name__ == "__main__":
+    # --single: the old one-date-per-packet mode
+    single = "--single" in sys.argv[1:]
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.connect((SHOST, SPORT))
+    logging.info(f"Connected to server {SHOST}:{SPORT}")
+
+    inputfile = input("Input file with dates: ")
+    outfile = input("Input file to output: ")
+
+    if single:
+        convert_single(s, inputfile, outfile)
+    else:
+        convert_batch(s, inputfile, outfile)
+
+    s.close()
+    logger.info("Disconected from server")
@@ -0,0 +1,94 @@
+"""
+Date conversion to "%d.%m.%Y" for the date server.
+
+Accepted input formats: "%d.%m.%Y", "%Y-%m-%d", "%m/%Y/%d". The format
+is picked by its separators, the numbers are taken by slicing (fixed
+width) or a precompiled regex, and datetime.date checks that the day
+exists. Only strings the fast path cannot read but strptime might (for
+example a space-padded day) go to the old strptime implementation, so the
+results are the same as convert_date_slow's. Invalid dates give "".
+"""
+import re
+from datetime import date as Date, datetime
+from functools import lru_cache
+from typing import Iterable, List
+
+FORMATS = ["%d.%m.%Y", "%Y-%m-%d", "%m/%Y/%d"]
+OUT_FORMAT = "%d.%m.%Y"
+# Distinct inputs remembered by convert_date
+CACHE_SIZE = 65536
+
+# (regex, positions of day, month, year among its groups); ASCII digits
+# only, other Unicode digits are left to strptime
+_PATTERNS = {
+    ".": (re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})", re.ASCII), (0, 1, 2)),
+    "-": (re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})", re.ASCII), (2, 1, 0)),
+    "/": (re.compile(r"(\d{1,2})/(\d{4})/(\d{1,2})", re.ASCII), (2, 0, 1)),
+}
+# Besides non-ASCII digits, the only thing strptime accepts and the regexes
+# do not is a space-padded day (" 1.02.2025", "2025-02- 1")
+_SPACE_PADDED = re.compile(r"(?:^|[./-]) \d")
+
+
+def convert_date_slow(date: str) -> str:
+    """The original implementation: strptime with each format in turn."""
+    for format in FORMATS:
+        try:
+            return datetime.strptime(date, format).strftime(OUT_FORMAT)
+        except ValueError:
+            pass
+
+    return ""
+
+
+def _format(day: int, month: int, year: int) -> str:
+    try:
+        d = Date(year, month, day)
+    except ValueError:
+        return ""
+    if year < 1000:
+        # strftime pads short years differently on different platforms
+        return d.strftime(OUT_FORMAT)
+    return f"{day:02d}.{month:02d}.{year}"
+
+
+def _slices(date: str):
+    """(day, month, year) of the fixed-width forms, or None."""
+    if len(date) != 10 or not date.isascii():
+        return None
+    if date[2] == date[5] == ".":
+        day, month, year = date[:2], date[3:5], date[6:]
+    elif date[4] == date[7] == "-":
+        day, month, year = date[8:], date[5:7], date[:4]
+    elif date[2] == date[7] == "/":
+        day, month, year = date[8:], date[:2], date[3:7]
+    else:
+        return None
+    if not (day.isdigit() and month.isdigit() and year.isdigit()):
+        return None
+    return int(day), int(month), int(year)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def convert_date(date: str) -> str:
+    parts = _slices(date)
+    if parts is not None:
+        return _format(*parts)
+
+    for sep, (pattern, (d, m, y)) in _PATTERNS.items():
+        if sep in date:
+            match = pattern.fullmatch(date)
+            if match:
+                groups = match.groups()
+                return _format(int(groups[d]), int(groups[m]), int(groups[y]))
+
+    if not date.isascii() or _SPACE_PADDED.search(date):
+        return convert_date_slow(date)
+    return ""
+
+
+def convert_dates(dates: Iterable[str]) -> List[str]:
+    """convert_date for many dates; each distinct date is converted once."""
+    dates = list(dates)
+    converted = {date: convert_date(date) for date in dict.fromkeys(dates)}
+    return list(map(converted.__getitem__, dates))
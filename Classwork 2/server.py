@@ -1,51 +1,92 @@
 import logging
 import socket
-from datetime import datetime
+import time
+
+from date_converter import convert_date, convert_dates
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-def convert_date(date: str) -> str:
-    formats = ["%d.%m.%Y", "%Y-%m-%d", "%m/%Y/%d"]
-    out_format = "%d.%m.%Y"
-
-    for format in formats:
-        try:
-            return datetime.strptime(date, format).strftime(out_format)
-        except ValueError:
-            pass
-
-    return ""
-
-
 HOST = "localhost"
 PORT = 8888
 BUFSIZE = 10
 MAX_CONNECTIONS = 5
 
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-logger.info("Server was started")
-s.bind((HOST, PORT))
-s.listen(MAX_CONNECTIONS)
+# Batch mode: the client sends this line, then one date per line and
+# closes its side (shutdown SHUT_WR). The server answers with one line per
+# date, in the same order; an empty line if the date is not recognized.
+BATCH_HEADER = b"BATCH\n"
+# Socket buffers of the batch mode and lines converted per write
+IO_BUFFER = 1024 * 1024
+LINES_PER_WRITE = 10000
 
-while True:
-    conn, addr = s.accept()
-
-    logger.info(f"Client {addr} connected")
 
+def handle_single(conn: socket.socket, addr) -> bool:
+    """Old mode: one date per recv, padded answer. True if the client sent CLOSE."""
     while True:
         data_bytes = conn.recv(BUFSIZE).strip()
+        if not data_bytes:
+            logger.info(f"Client {addr} disconected")
+            return False
         data = data_bytes.decode()
         logger.info(f"Reviced: {data} from client: {addr}")
 
         if data == "CLOSE":
             logging.info(f"Client {addr} disconected")
-            conn.close()
-            s.close()
-            exit(0)
+            return True
 
         converted = convert_date(data)
         conn.send(bytes(converted, encoding="utf-8").ljust(BUFSIZE))
 
+
+def handle_batch(conn: socket.socket, addr):
+    """Batch mode: reads the whole stream, answers in large writes."""
+    start = time.perf_counter()
+    count = 0
+    with conn.makefile("rb", buffering=IO_BUFFER) as rfile, \
+            conn.makefile("wb", buffering=IO_BUFFER) as wfile:
+        rfile.readline()    # BATCH
+        while lines := rfile.readlines(IO_BUFFER):
+            dates = [line.strip().decode("utf-8", "replace") for line in lines]
+            dates = [date for date in dates if date]
+            for i in range(0, len(dates), LINES_PER_WRITE):
+                converted = convert_dates(dates[i:i + LINES_PER_WRITE])
+                wfile.write("".join(f"{date}\n" for date in converted).encode())
+            count += len(dates)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Client {addr}: {count} dates in {elapsed:.2f} s "
+                f"({count / elapsed if elapsed else 0:.0f} dates/s)")
+
+
+def is_batch(conn: socket.socket) -> bool:
+    """Looks at the first bytes without taking them from the socket."""
+    head = conn.recv(len(BATCH_HEADER), socket.MSG_PEEK)
+    if head and head != BATCH_HEADER and BATCH_HEADER.startswith(head):
+        # The header came in pieces
+        head = conn.recv(len(BATCH_HEADER), socket.MSG_PEEK | socket.MSG_WAITALL)
+    return head == BATCH_HEADER
+
+
+def serve(host: str = HOST, port: int = PORT):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    logger.info("Server was started")
+    s.bind((host, port))
+    s.listen(MAX_CONNECTIONS)
+
+    with s:
+        while True:
+            conn, addr = s.accept()
+            logger.info(f"Client {addr} connected")
+            with conn:
+                if is_batch(conn):
+                    handle_batch(conn, addr)
+                elif handle_single(conn, addr):
+                    # CLOSE from an old client stops the server, as before
+                    return
+
+
+if __name__ == "__main__":
+    serve()
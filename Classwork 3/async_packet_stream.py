@@ -0,0 +1,238 @@
+"""
+asyncio counterpart of packet_stream on StreamReader/StreamWriter.
+
+The wire format is the same (v1 Header/Packet, v2 frames, HELLO,
+MSG_RAW, compressed frames), so blocking and async peers can talk to each
+other. Disk I/O of send_file/recv_file runs in worker threads
+(asyncio.to_thread), so one event loop can serve many connections.
+"""
+import asyncio
+import os
+import struct
+from typing import AsyncIterator, Optional, Union
+
+from packet_stream import Header, V2Header
+from packet_stream import HEADER_SIZE, V2_MAGIC, V2_VERSION, V2_HEADER_FMT
+from packet_stream import PACKET_DATA_SIZE, PACKET_SIZE
+from packet_stream import PACKET_HEADER_FMT, PACKET_HEADER_SIZE, SCATTER_BATCH
+from packet_stream import MSG_STREAM, MSG_HELLO, MSG_RAW, FEATURES
+from packet_stream import FRAME_FMT, FRAME_SIZE, MAX_CHUNK, DEFAULT_CHUNK
+from packet_stream import Compressor
+from packet_stream import pack_header, unpack_header, pack_packet
+from packet_stream import get_header, get_packets, pack_v2_header
+from packet_stream import check_chunk_size, encode
+from packet_stream import _frame, _decompress, _open_for_save
+
+# Bytes collected from v1 messages before one disk write
+WRITE_BUFFER = 1024 * 1024
+
+
+async def recv_exact(reader: asyncio.StreamReader, size: int) -> bytes:
+    try:
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("connection closed in the middle of a message")
+
+
+async def recv_header(reader: asyncio.StreamReader) -> Union[Header, V2Header]:
+    """Next message header: Header for v1 senders, V2Header for v2."""
+    buf = await recv_exact(reader, HEADER_SIZE)
+    if buf[:len(V2_MAGIC)] == V2_MAGIC:
+        _, version, flags, features, size = struct.unpack(V2_HEADER_FMT, buf)
+        if version != V2_VERSION:
+            raise ValueError(f"unsupported protocol version {version}")
+        return V2Header(size, flags, features)
+    return unpack_header(buf)
+
+
+async def _recv_payload(reader: asyncio.StreamReader, header: Header, view: memoryview):
+    """v1 packets of a message into `view`, SCATTER_BATCH packets per read."""
+    if header.parts * PACKET_DATA_SIZE < header.size:
+        raise ValueError(f"{header.parts} parts cannot hold {header.size} bytes")
+    left = header.parts
+    while left:
+        count = min(left, SCATTER_BATCH)
+        block = memoryview(await recv_exact(reader, count * PACKET_SIZE))
+        for pos in range(0, len(block), PACKET_SIZE):
+            size, part = struct.unpack_from(PACKET_HEADER_FMT, block, pos)
+            offset = part * PACKET_DATA_SIZE
+            if size > PACKET_DATA_SIZE or offset + size > header.size:
+                raise ValueError(f"bad packet {part} of {size} bytes")
+            start = pos + PACKET_HEADER_SIZE
+            view[offset:offset + size] = block[start:start + size]
+        left -= count
+
+
+async def _recv_frames(reader: asyncio.StreamReader, view: memoryview):
+    """v2 frames of a sized message into `view`."""
+    pos = 0
+    while pos < len(view):
+        flags, length = struct.unpack(FRAME_FMT, await recv_exact(reader, FRAME_SIZE))
+        if not length or length > len(view) - pos:
+            raise ValueError(f"bad frame of {length} bytes at {pos}/{len(view)}")
+        data = await recv_exact(reader, length)
+        if flags:
+            data = _decompress(flags, data, len(view) - pos)
+        view[pos:pos + len(data)] = data
+        pos += len(data)
+
+
+async def iter_frames(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Data of a v2 stream message (after its header), frame by frame."""
+    while True:
+        flags, length = struct.unpack(FRAME_FMT, await recv_exact(reader, FRAME_SIZE))
+        if not length:
+            return
+        if length > MAX_CHUNK:
+            raise ValueError(f"frame of {length} bytes exceeds {MAX_CHUNK}")
+        data = await recv_exact(reader, length)
+        yield _decompress(flags, data, MAX_CHUNK) if flags else data
+
+
+async def recv_data(reader: asyncio.StreamReader) -> bytearray:
+    """Next message, v1 or v2 (including stream messages)."""
+    header = await recv_header(reader)
+    if isinstance(header, V2Header):
+        if header.flags & MSG_HELLO:
+            raise ValueError("unexpected HELLO outside of negotiate()")
+        if header.flags & MSG_STREAM:
+            data = bytearray()
+            async for frame in iter_frames(reader):
+                data += frame
+            return data
+        if header.flags & MSG_RAW:
+            return bytearray(await recv_exact(reader, header.size))
+    data = bytearray(header.size)
+    with memoryview(data) as view:
+        if isinstance(header, V2Header):
+            await _recv_frames(reader, view)
+        else:
+            await _recv_payload(reader, header, view)
+    return data
+
+
+async def send_data(writer: asyncio.StreamWriter, data: bytes,
+                    chunk_size: Optional[int] = None,
+                    compressor: Optional[Compressor] = None):
+    """
+    Same messages as packet_stream.send_data. Everything is written before
+    the first await, so messages of concurrent tasks never interleave.
+    """
+    if chunk_size:
+        view = memoryview(data).cast("B")
+        buffers = [pack_v2_header(len(view))]
+        for offset in range(0, len(view), chunk_size):
+            buffers += _frame(view[offset:offset + chunk_size], compressor)
+        writer.writelines(buffers)
+    else:
+        writer.write(pack_header(get_header(data)))
+        writer.writelines(pack_packet(packet) for packet in get_packets(data))
+    # Waits while the peer is slower than us
+    await writer.drain()
+
+
+async def negotiate_features(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                             chunk_size: int = DEFAULT_CHUNK, features: int = FEATURES):
+    """Agree on the v2 chunk size and features (see packet_stream)."""
+    chunk_size = check_chunk_size(chunk_size)
+    writer.write(pack_v2_header(chunk_size, MSG_HELLO, features))
+    await writer.drain()
+    header = await recv_header(reader)
+    if not isinstance(header, V2Header) or not header.flags & MSG_HELLO:
+        raise ConnectionError("peer did not answer the v2 HELLO")
+    return check_chunk_size(min(chunk_size, header.size)), features & header.features
+
+
+async def negotiate(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    chunk_size: int = DEFAULT_CHUNK) -> int:
+    return (await negotiate_features(reader, writer, chunk_size))[0]
+
+
+async def send_file(writer: asyncio.StreamWriter,
+                    filepath: str, savepath: str,
+                    chunk_size: Optional[int] = None,
+                    raw: bool = False,
+                    compressor: Optional[Compressor] = None):
+    """Same messages as packet_stream.send_file; raw uses loop.sendfile."""
+    f = await asyncio.to_thread(open, filepath, "rb")
+    try:
+        await send_data(writer, encode(f"SAVE_TO {savepath}"), chunk_size)
+        if raw and compressor is None:
+            size = os.fstat(f.fileno()).st_size
+            writer.write(pack_v2_header(size, MSG_RAW))
+            await writer.drain()
+            sent = await asyncio.get_running_loop().sendfile(writer.transport, f, 0, size)
+            if sent != size:
+                raise ConnectionError(f"{filepath} shrank while sending "
+                                      f"({sent} of {size} bytes)")
+            return
+        if chunk_size:
+            writer.write(pack_v2_header(0, MSG_STREAM))
+            while chunk := await asyncio.to_thread(f.read, chunk_size):
+                writer.writelines(_frame(memoryview(chunk), compressor))
+                await writer.drain()
+            writer.write(struct.pack(FRAME_FMT, 0, 0))
+            await writer.drain()
+            return
+        # v1: one message per 1 KB chunk, read from disk in larger blocks
+        while block := await asyncio.to_thread(f.read, WRITE_BUFFER):
+            for offset in range(0, len(block), PACKET_DATA_SIZE):
+                await send_data(writer, block[offset:offset + PACKET_DATA_SIZE])
+        await send_data(writer, b"EOF")
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+async def recv_file(reader: asyncio.StreamReader, root: Optional[str] = None,
+                    message: Optional[bytes] = None) -> str:
+    """Receive a file sent by send_file (blocking or async); see packet_stream.recv_file."""
+    if message is None:
+        message = await recv_data(reader)
+    command, savepath = bytes(message).decode().split(maxsplit=1)
+    if command != "SAVE_TO":
+        raise ValueError(f"expected SAVE_TO, got {command}")
+
+    f, savepath = await asyncio.to_thread(_open_for_save, root, savepath)
+    try:
+        header = await recv_header(reader)
+        if isinstance(header, V2Header) and header.flags & MSG_RAW:
+            left = header.size
+            while left:
+                data = await recv_exact(reader, min(left, WRITE_BUFFER))
+                await asyncio.to_thread(f.write, data)
+                left -= len(data)
+            return savepath
+        if isinstance(header, V2Header) and header.flags & MSG_STREAM:
+            async for frame in iter_frames(reader):
+                await asyncio.to_thread(f.write, frame)
+            return savepath
+
+        # v1: one message per chunk until "EOF", written in larger blocks
+        pending = bytearray()
+        while True:
+            if isinstance(header, V2Header):
+                data = await _recv_sized(reader, header)
+            else:
+                data = bytearray(header.size)
+                await _recv_payload(reader, header, memoryview(data))
+            if data == b"EOF":
+                break
+            pending += data
+            if len(pending) >= WRITE_BUFFER:
+                await asyncio.to_thread(f.write, pending)
+                pending = bytearray()
+            header = await recv_header(reader)
+        if pending:
+            await asyncio.to_thread(f.write, pending)
+        return savepath
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+async def _recv_sized(reader: asyncio.StreamReader, header: V2Header) -> bytearray:
+    if header.flags & (MSG_STREAM | MSG_HELLO | MSG_RAW):
+        raise ValueError("expected a sized v2 message")
+    data = bytearray(header.size)
+    with memoryview(data) as view:
+        await _recv_frames(reader, view)
+    return data
@@ -0,0 +1,192 @@
+"""
+BackupServer on asyncio: the same JOIN/WAIT/READY handshake and byte relay
+as server.py, but all connections share one thread and one event loop.
+"""
+import logging
+
+logging.basicConfig(level=logging.INFO,
+                    format="[%(levelname)s] :: %(asctime)s : %(message)s")
+logger = logging.getLogger(__name__)
+
+import asyncio
+from async_packet_stream import send_data, recv_data
+from async_packet_stream import negotiate
+
+ROLES = ("sender", "recver")
+# Seconds a client waits for the other side of its session
+PAIR_TIMEOUT = 600
+# Seconds between checks that a waiting client is still connected
+POLL_INTERVAL = 1.0
+# Bytes moved per read while relaying
+RELAY_BUFFER = 256 * 1024
+# Pending connections the OS queues for us
+BACKLOG = 4096
+
+
+class Pair:
+    """Sender and receiver of one backup session."""
+    def __init__(self, session: str):
+        self.session = session
+        self.readers = {}
+        self.writers = {}
+        self.paired = False
+        # Set when pairing is over, also when it failed
+        self.ready = asyncio.Event()
+        self.failed = False
+        # Relay directions still running; sockets close after both
+        self.running = 2
+        self.done = asyncio.Event()
+
+    def peer(self, role: str) -> asyncio.StreamWriter:
+        other, = (r for r in ROLES if r != role)
+        return self.writers[other]
+
+    def is_closed(self, role: str) -> bool:
+        """The client sends nothing while waiting, so EOF means it left."""
+        return self.readers[role].at_eof() or self.writers[role].is_closing()
+
+
+async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> int:
+    """
+    Copy bytes until the reader hits EOF, without decoding frames. While
+    drain() waits for a slow receiver nothing is read, the reader's buffer
+    fills up and asyncio stops reading the socket (backpressure).
+    """
+    total = 0
+    while data := await reader.read(RELAY_BUFFER):
+        writer.write(data)
+        await writer.drain()
+        total += len(data)
+    if writer.can_write_eof():
+        writer.write_eof()
+    return total
+
+
+class BackupServer:
+    def __init__(self):
+        self.pairs = {}     # session -> Pair still waiting
+
+    def leave(self, pair: Pair, role: str) -> bool:
+        """Removes a client that is still unpaired; False if it got paired."""
+        if pair.paired:
+            return False
+        pair.readers.pop(role, None)
+        pair.writers.pop(role, None)
+        if not pair.writers and self.pairs.get(pair.session) is pair:
+            del self.pairs[pair.session]
+        return True
+
+    async def join(self, session: str, role: str,
+                   reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Pair for the session once both sides are there; None if not paired.
+        A second client whose waiting peer is gone waits in its place.
+        """
+        while True:
+            pair = self.pairs.get(session)
+            if pair is None:
+                pair = self.pairs[session] = Pair(session)
+            if role in pair.writers:
+                await send_data(writer, b"BUSY")
+                logger.warning("SESSION %s: %s already connected", session, role)
+                return None
+            pair.readers[role] = reader
+            pair.writers[role] = writer
+
+            if len(pair.writers) < 2:
+                return await self.wait(pair, role)
+
+            # The session ID is free for the next backup
+            del self.pairs[session]
+            pair.paired = True
+            # The waiting client gets READY first: if it is gone, this one
+            # has not been told anything yet and waits in its place
+            other, = (r for r in ROLES if r != role)
+            try:
+                if pair.is_closed(other):
+                    raise ConnectionError("waiting client disconnected")
+                await send_data(pair.writers[other], b"READY")
+            except OSError:
+                logger.info("SESSION %s: waiting peer is gone", session)
+                pair.failed = True
+                pair.ready.set()
+                continue
+            try:
+                await send_data(writer, b"READY")
+            except OSError:
+                pair.failed = True
+                raise
+            finally:
+                pair.ready.set()
+            return pair
+
+    async def wait(self, pair: Pair, role: str):
+        """Waits for the other client; None if it did not come or we left."""
+        writer = pair.writers[role]
+        try:
+            await send_data(writer, b"WAIT")
+        except OSError:
+            pass    # noticed as a closed connection below
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PAIR_TIMEOUT
+        while not pair.ready.is_set():
+            if loop.time() >= deadline or pair.is_closed(role):
+                closed = pair.is_closed(role)
+                if self.leave(pair, role):
+                    if not closed:
+                        await send_data(writer, b"TIMEOUT")
+                    logger.info("SESSION %s: %s stopped waiting", pair.session, role)
+                    return None
+            try:
+                await asyncio.wait_for(pair.ready.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        return None if pair.failed else pair
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        address = writer.get_extra_info("peername")
+        logger.info("CLIENT %s connected", address)
+        try:
+            await negotiate(reader, writer)
+            # JOIN <session> <role>
+            command, session, role = (await recv_data(reader)).decode().split()
+            if command != "JOIN" or role not in ROLES:
+                raise ValueError(f"expected JOIN <session> <role>, got {command}")
+            pair = await self.join(session, role, reader, writer)
+        except (OSError, ValueError) as e:
+            logger.warning("CLIENT %s: bad handshake (%s)", address, e)
+            writer.close()
+            return
+        if pair is None:
+            writer.close()
+            return
+
+        peer = pair.peer(role)
+        try:
+            total = await pipe(reader, peer)
+            logger.info("SESSION %s: %s sent %d bytes", session, role, total)
+        except OSError as e:
+            logger.warning("SESSION %s: %s relay failed (%s)", session, role, e)
+            # Wake the other direction up
+            writer.transport.abort()
+            peer.transport.abort()
+        finally:
+            pair.running -= 1
+            if not pair.running:
+                pair.done.set()
+            try:
+                await asyncio.wait_for(pair.done.wait(), PAIR_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port, backlog=BACKLOG)
+        async with server:
+            print("SERVER STARTED")
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    HOST, PORT = "localhost", 9999
+    asyncio.run(BackupServer().serve(HOST, PORT))
@@ -1,71 +1,281 @@
 import os
-import sys
 import socket
+import threading
 import time
+import queue
+import argparse
+from typing import Optional
 
 from packet_stream import send_data, recv_data
 from packet_stream import send_file, recv_file
-from packet_stream import encode
+from packet_stream import send_batch, recv_batch
+from packet_stream import send_file_resumable, recv_file_resumable
+from packet_stream import send_batch_resumable, recv_batch_resumable
+from packet_stream import encode, negotiate_features
+from packet_stream import Compressor, TransferStats
+from packet_stream import DEFAULT_CHUNK, FEATURE_RAW
 
 from enum import Enum
 
+DEFAULT_SESSION = "default"
+# Parallel connections of one backup (both sides must use the same number)
+CONNECTIONS = 4
+# Files smaller than this are sent in batches
+SMALL_FILE = 64 * 1024
+BATCH_FILES = 1000
+BATCH_BYTES = 4 * 1024 * 1024
+MB = 1024 * 1024
+
 
 class ClientType(str, Enum):
     BACKUP_SENDER = "Backup sender"
     BACKUP_RECVER = "Backup reciver"
 
 
+class Throughput:
+    """Files and bytes moved by all connections of one backup."""
+    def __init__(self, verbose: bool = True):
+        self.verbose = verbose
+        # Compression of all connections (sender only)
+        self.transfer = TransferStats()
+        self.files = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, name: str, files: int, size: int, seconds: float):
+        with self.lock:
+            self.files += files
+            self.bytes += size
+        if self.verbose:
+            rate = size / MB / seconds if seconds else 0
+            print(f"{name}: {size / MB:.2f} MB, {rate:.1f} MB/s")
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        print(f"TOTAL: {self.files} files, {self.bytes / MB:.1f} MB in {elapsed:.2f} s "
+              f"({self.bytes / MB / elapsed:.1f} MB/s, {self.files / elapsed:.0f} files/s)")
+        if self.transfer.chunks:
+            print(f"COMPRESSION: {self.transfer}")
+
+
 class Client:
     def __init__(self, host: str, port: int,
-                 client_type: ClientType):
+                 client_type: ClientType,
+                 session: str = DEFAULT_SESSION,
+                 chunk_size: int = DEFAULT_CHUNK,
+                 resume: bool = False,
+                 compress: Optional[str] = None, level: int = 6,
+                 transfer: Optional[TransferStats] = None):
         self.host = host
         self.port = port
         self.client_type = client_type
+        # Sender and receiver with the same session ID are paired by the server
+        self.session = session
+        self.chunk_size = chunk_size
+        # Files go through socket.sendfile when the receiver supports it
+        self.raw = False
+        # Large files in checked parts that survive an interrupted backup
+        self.resume = resume
+        # "zlib" or "lzma": frames are compressed if the receiver can unpack them
+        self.compress = compress
+        self.level = level
+        self.transfer = transfer
+        self.compressor = None
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
         self.connect()
 
     def connect(self):
         self.s.connect((self.host, self.port))
+        # Handshake with the server itself
+        negotiate_features(self.s, self.chunk_size)
+        role = "sender" if self.client_type is ClientType.BACKUP_SENDER else "recver"
+        send_data(self.s, encode(f"JOIN {self.session} {role}"))
 
         while True:
             status = recv_data(self.s)
             if status == b"READY":
-                return
-            else:
+                break
+            elif status == b"WAIT":
                 print("WAITING")
+            else:
+                raise ConnectionError(f"server refused session: {status.decode()}")
+
+        # From here the server only relays bytes: frame size and features
+        # of protocol v2 are agreed with the other client
+        self.chunk_size, features = negotiate_features(self.s, self.chunk_size)
+        self.raw = bool(features & FEATURE_RAW)
+        if self.compress:
+            compressor = Compressor(self.compress, self.level, self.transfer)
+            if features & compressor.feature:
+                self.compressor = compressor
+            else:
+                print(f"RECEIVER CANNOT UNPACK {self.compress}: sending uncompressed")
 
     def close(self):
         self.s.close()
 
-    def backup(self):
+    def _send_backup(self, jobs: queue.Queue, stats: Throughput):
+        """Send jobs from the queue until None, then DONE."""
+        while (job := jobs.get()) is not None:
+            kind, entries = job
+            t = time.perf_counter()
+            if kind == "file":
+                relpath, path, size = entries
+                try:
+                    if self.resume:
+                        size = send_file_resumable(self.s, path, relpath)
+                    else:
+                        send_file(self.s, path, relpath, self.chunk_size, self.raw,
+                                  self.compressor)
+                except FileNotFoundError:
+                    print(f"SKIPPED {relpath}: file is gone")
+                    continue
+                stats.add(relpath, 1, size, time.perf_counter() - t)
+                continue
+
+            if self.resume:
+                # Files the receiver already has are not even read
+                files = [(relpath, path) for relpath, path, _ in entries]
+                sent = send_batch_resumable(self.s, files, self.chunk_size, self.compressor)
+                stats.add(f"batch of {len(sent)} files", len(sent),
+                          sum(size for _, size in sent), time.perf_counter() - t)
+                continue
+            files = []
+            for relpath, path, _ in entries:
+                try:
+                    with open(path, "rb") as f:
+                        files.append((relpath, f.read()))
+                except FileNotFoundError:
+                    print(f"SKIPPED {relpath}: file is gone")
+            send_batch(self.s, files, self.chunk_size, self.compressor)
+            stats.add(f"batch of {len(files)} files", len(files),
+                      sum(len(data) for _, data in files), time.perf_counter() - t)
+        send_data(self.s, b"DONE", self.chunk_size)
+
+    def _recv_backup(self, path: str, stats: Throughput):
+        """Save files under `path` until the sender says DONE."""
         while True:
-            if self.client_type is ClientType.BACKUP_SENDER:
-                send_data(self.s, b"HELLO")
-                time.sleep(1)
+            message = recv_data(self.s)
+            t = time.perf_counter()
+            if message == b"DONE":
+                return
+            if message.startswith((b"BATCH ", b"RESUME_BATCH ")):
+                receive = recv_batch_resumable if message.startswith(b"RESUME_") else recv_batch
+                saved = receive(self.s, path, message)
+                stats.add(f"batch of {len(saved)} files", len(saved),
+                          sum(size for _, size in saved), time.perf_counter() - t)
             else:
-                print(recv_data(self.s).decode())
+                receive = recv_file_resumable if message.startswith(b"RESUME ") else recv_file
+                savepath = receive(self.s, path, message)
+                stats.add(os.path.relpath(savepath, path), 1,
+                          os.path.getsize(savepath), time.perf_counter() - t)
 
-    def _send_backup(self, path: str):
-        for dir, subdir, files in os.walk(path):
-            send_data(self.s, encode(f"{dir} {subdir} {files}"))
 
-    def _recv_backup(self, path: str):
-        while data := recv_data(self.s):
-            print(data)
+def scan_tree(root: str):
+    """(relative path with "/", path, size) of every file under root."""
+    stack = [("", root)]
+    while stack:
+        reldir, folder = stack.pop()
+        with os.scandir(folder) as it:
+            for entry in it:
+                relpath = reldir + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((relpath + "/", entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    yield relpath, entry.path, entry.stat(follow_symlinks=False).st_size
+
+
+def plan_jobs(root: str, jobs: queue.Queue, connections: int):
+    """Large files one by one, small ones in batches; then None per connection."""
+    try:
+        batch, batch_bytes = [], 0
+        for relpath, path, size in scan_tree(root):
+            if size >= SMALL_FILE:
+                jobs.put(("file", (relpath, path, size)))
+                continue
+            batch.append((relpath, path, size))
+            batch_bytes += size
+            if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                jobs.put(("batch", batch))
+                batch, batch_bytes = [], 0
+        if batch:
+            jobs.put(("batch", batch))
+    finally:
+        for _ in range(connections):
+            jobs.put(None)
+
+
+def run_parallel(host: str, port: int, client_type: ClientType, session: str,
+                 connections: int, work, verbose: bool = True,
+                 resume: bool = False, compress: Optional[str] = None,
+                 level: int = 6) -> Throughput:
+    """work(client, stats) on each of the pairs "<session>.<i>"."""
+    stats = Throughput(verbose)
+    errors = []
+
+    def worker(i):
+        try:
+            client = Client(host, port, client_type, f"{session}.{i}", resume=resume,
+                            compress=compress, level=level, transfer=stats.transfer)
+            try:
+                work(client, stats)
+            finally:
+                client.close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(connections)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    stats.report()
+    return stats
+
+
+def send_tree(host: str, port: int, path: str, session: str = DEFAULT_SESSION,
+              connections: int = CONNECTIONS, verbose: bool = True,
+              resume: bool = False, compress: Optional[str] = None,
+              level: int = 6) -> Throughput:
+    # Bounded, so the scan does not run far ahead of the connections
+    jobs = queue.Queue(maxsize=connections * 4)
+    threading.Thread(target=plan_jobs, args=(path, jobs, connections),
+                     daemon=True).start()
+    return run_parallel(host, port, ClientType.BACKUP_SENDER, session, connections,
+                        lambda client, stats: client._send_backup(jobs, stats),
+                        verbose, resume, compress, level)
+
+
+def recv_tree(host: str, port: int, path: str, session: str = DEFAULT_SESSION,
+              connections: int = CONNECTIONS, verbose: bool = True) -> Throughput:
+    return run_parallel(host, port, ClientType.BACKUP_RECVER, session, connections,
+                        lambda client, stats: client._recv_backup(path, stats), verbose)
 
 
 if __name__ == "__main__":
     HOST, PORT = "localhost", 9999
 
-    t = sys.argv[1]
-    if t == "sender":
-        ct = ClientType.BACKUP_SENDER
-    elif t == "recver":
-        ct = ClientType.BACKUP_RECVER
-    else:
-        raise Exception("Invalid type of client")
+    parser = argparse.ArgumentParser(description="Directory backup through the relay server")
+    parser.add_argument("type", choices=["sender", "recver"])
+    parser.add_argument("path", help="directory to back up / to save the backup to")
+    parser.add_argument("session", nargs="?", default=DEFAULT_SESSION)
+    parser.add_argument("-c", "--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only the total, without a line per file")
+    parser.add_argument("-r", "--resume", action="store_true",
+                        help="a repeated backup skips the files already received "
+                             "and continues the interrupted ones")
+    parser.add_argument("-z", "--compress", choices=["zlib", "lzma"],
+                        help="compress chunks that shrink (resumed files are not compressed)")
+    parser.add_argument("--level", type=int, default=6, help="compression level")
+    args = parser.parse_args()
 
-    client = Client(HOST, PORT, ct)
-    client.backup()
-    client.close()
\ No newline at end of file
+    if args.type == "sender":
+        send_tree(HOST, PORT, args.path, args.session, args.connections, not args.quiet,
+                  args.resume, args.compress, args.level)
+    else:
+        recv_tree(HOST, PORT, args.path, args.session, args.connections, not args.quiet)
@@ -1,13 +1,23 @@
 import socket
 import os
+import json
+import threading
+import time
+import zlib
 from collections import namedtuple
 from io import BytesIO
 import struct
-from typing import Iterator
+from typing import Iterable, Iterator, Optional, Union
 
+try:
+    import lzma
+except ImportError:     # Python built without liblzma
+    lzma = None
 
 Header = namedtuple("Header", "size parts")
 Packet = namedtuple("Packet", "size part data")
+# Protocol v2 message header (see below)
+V2Header = namedtuple("V2Header", "size flags features", defaults=(0,))
 
 # Q: unsigned long long - Total file size to send
 # Q: unsigned long long - Parts to send
@@ -21,6 +31,82 @@ PACKET_DATA_SIZE = 1024
 PACKET_FMT = f"!QQ{PACKET_DATA_SIZE}s"
 PACKET_SIZE = struct.calcsize(PACKET_FMT)
 
+# Fixed part of a packet: size and part number
+PACKET_HEADER_FMT = "!QQ"
+PACKET_HEADER_SIZE = struct.calcsize(PACKET_HEADER_FMT)
+
+# Buffers per recvmsg_into / sendmsg call (well below the usual IOV_MAX of 1024)
+SCATTER_BATCH = 256
+
+# --- Protocol v2 ---
+# Messages are variable-length frames without padding, so large chunks
+# cost 5 bytes of framing instead of 16 bytes + padding per 1 KB.
+#
+# The v2 message header has the same 16 bytes as the v1 Header, so the
+# receiver tells them apart by the first bytes: a v1 header starts with
+# the payload size, and no real size begins with the magic.
+# 4s: magic, B: version, B: message flags,
+# H: feature bits (HELLO only, otherwise 0), Q: payload size
+V2_MAGIC = b"PSv2"
+V2_VERSION = 2
+V2_HEADER_FMT = "!4sBBHQ"
+
+# Message flags
+MSG_STREAM = 0x01   # size unknown up front: frames until an empty frame
+MSG_HELLO = 0x02    # negotiation, no payload: size is the proposed chunk size
+MSG_RAW = 0x04      # payload follows the header as is, without frames
+
+# Features announced in HELLO; a feature is used only if both ends have it
+FEATURE_RAW = 0x0001    # can receive MSG_RAW (file bodies sent with sendfile)
+FEATURE_ZLIB = 0x0002   # can decompress FRAME_ZLIB frames
+FEATURE_LZMA = 0x0004   # can decompress FRAME_LZMA frames
+FEATURES = FEATURE_RAW | FEATURE_ZLIB | (FEATURE_LZMA if lzma else 0)
+
+# B: frame flags, I: data length; the data follows
+FRAME_FMT = "!BI"
+FRAME_SIZE = struct.calcsize(FRAME_FMT)
+
+# Frame flags: the frame data is one independently compressed chunk
+FRAME_ZLIB = 0x01
+FRAME_LZMA = 0x02
+# A chunk is sent compressed only if it shrinks below this share
+MAX_RATIO = 0.9
+# Chunks sent as is after an incompressible one; doubles up to MAX_SKIP
+MAX_SKIP = 16
+
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+DEFAULT_CHUNK = 1024 * 1024
+
+# Batch of small files: "BATCH <count>" and one message with the entries
+# H: path length, I: data length; the UTF-8 path and the data follow
+BATCH_ENTRY_FMT = "!HI"
+BATCH_ENTRY_SIZE = struct.calcsize(BATCH_ENTRY_FMT)
+
+# Resumable transfer: "RESUME <size> <part size> <mtime_ns> <path>", then
+# rounds of: the receiver sends a bitmap of the parts it has, the sender
+# sends the missing ones as MSG_RAW messages (part header + data). A
+# finished file gets the sender's mtime, so a file that is already there
+# with the same size and mtime is answered with a full bitmap at once.
+# Q: part number, I: CRC32 of the data
+PART_FMT = "!QI"
+PART_HEADER_SIZE = struct.calcsize(PART_FMT)
+PART_SIZE = 1024 * 1024
+# Rounds before the sender gives up on parts that keep failing the CRC;
+# it then sends ABORT instead of the parts, so the receiver stops too
+MAX_ROUNDS = 5
+ABORT = b"ABORT"
+# Resumable batch: "RESUME_BATCH <count>" and a listing of the files, the
+# receiver answers with a bitmap of the files it already has (same size
+# and mtime), then a send_batch of the others follows.
+# H: path length, Q: size, Q: mtime_ns; the UTF-8 path follows
+LISTING_ENTRY_FMT = "!HQQ"
+LISTING_ENTRY_SIZE = struct.calcsize(LISTING_ENTRY_FMT)
+# Seconds between manifest updates on the receiver
+MANIFEST_EVERY = 1.0
+PARTIAL_SUFFIX = ".part"
+MANIFEST_SUFFIX = ".part.json"
+
 
 def pack_header(header: Header) -> bytes:
     return struct.pack(HEADER_FMT, *header)
@@ -42,10 +128,8 @@ def unpack_packet(packed_packet: bytes) -> Packet:
 
 def get_header(data: bytes) -> Header:
     data_size = len(data)
-    parts = data_size // PACKET_DATA_SIZE
-
-    if data_size < PACKET_DATA_SIZE:
-        parts += 1
+    # One packet per started PACKET_DATA_SIZE block (same as get_packets)
+    parts = -(-data_size // PACKET_DATA_SIZE)
 
     header = Header(data_size, parts)
     return header
@@ -61,19 +145,93 @@ def get_packets(data: bytes) -> Iterator[Packet]:
             yield packet
 
 
-def recvall(socket: socket.socket, size: int) -> bytes:
-    data = b""
-
-    while len(data) < size:
-        part = socket.recv(size - len(data))
-        if not part:
+def recv_exact(socket: socket.socket, view: memoryview) -> int:
+    """Fill `view` from the socket; returns bytes received (less only on EOF)."""
+    received = 0
+    size = len(view)
+    while received < size:
+        n = socket.recv_into(view[received:])
+        if not n:
             break
-        data += part
+        received += n
+    return received
 
+
+def recvall(socket: socket.socket, size: int) -> bytearray:
+    data = bytearray(size)
+    with memoryview(data) as view:
+        received = recv_exact(socket, view)
+    del data[received:]
     return data
 
 
-def send_data(socket: socket.socket, data: bytes):
+def _recv_into_or_fail(socket: socket.socket, view: memoryview):
+    if recv_exact(socket, view) < len(view):
+        raise ConnectionError("connection closed in the middle of a message")
+
+
+def _sendv(socket: socket.socket, buffers: list):
+    """Send all `buffers` in order, gathered into few calls where sendmsg exists."""
+    if not hasattr(socket, "sendmsg"):
+        for buf in buffers:
+            socket.sendall(buf)
+        return
+    buffers = [memoryview(buf) for buf in buffers if len(buf)]
+    i = 0
+    while i < len(buffers):
+        n = socket.sendmsg(buffers[i:i + SCATTER_BATCH])
+        while n:
+            size = len(buffers[i])
+            if n < size:
+                buffers[i] = buffers[i][n:]
+                break
+            n -= size
+            i += 1
+
+
+def pack_v2_header(size: int, flags: int = 0, features: int = 0) -> bytes:
+    return struct.pack(V2_HEADER_FMT, V2_MAGIC, V2_VERSION, flags, features, size)
+
+
+def check_chunk_size(chunk_size: int) -> int:
+    return max(MIN_CHUNK, min(MAX_CHUNK, int(chunk_size)))
+
+
+def negotiate_features(socket: socket.socket, chunk_size: int = DEFAULT_CHUNK,
+                       features: int = FEATURES):
+    """
+    Agree on the v2 chunk size and features. Both ends call this right after
+    connecting: each proposes a size, both take the smaller one (within
+    MIN_CHUNK..MAX_CHUNK) and the features both of them announced.
+    """
+    chunk_size = check_chunk_size(chunk_size)
+    socket.sendall(pack_v2_header(chunk_size, MSG_HELLO, features))
+    header = recv_header(socket)
+    if not isinstance(header, V2Header) or not header.flags & MSG_HELLO:
+        raise ConnectionError("peer did not answer the v2 HELLO")
+    return check_chunk_size(min(chunk_size, header.size)), features & header.features
+
+
+def negotiate(socket: socket.socket, chunk_size: int = DEFAULT_CHUNK) -> int:
+    """negotiate_features() for callers that need only the chunk size."""
+    return negotiate_features(socket, chunk_size)[0]
+
+
+def send_data(socket: socket.socket, data: bytes,
+              chunk_size: Optional[int] = None,
+              compressor: Optional["Compressor"] = None):
+    """
+    Send one message: v1 packets by default, v2 frames of chunk_size if
+    given, compressed chunk by chunk when a compressor is given.
+    """
+    if chunk_size:
+        view = memoryview(data).cast("B")
+        buffers = [pack_v2_header(len(view))]
+        for offset in range(0, len(view), chunk_size):
+            buffers += _frame(view[offset:offset + chunk_size], compressor)
+        _sendv(socket, buffers)
+        return
+
     # send header
     header = pack_header(get_header(data))
     socket.sendall(header)
@@ -84,43 +242,661 @@ def send_data(socket: socket.socket, data: bytes):
         socket.sendall(send_packet)
 
 
-def recv_data(socket: socket.socket) -> bytes:
-    # recv header
-    recv_header = recvall(socket, HEADER_SIZE)
-    header = unpack_header(recv_header)
-
-    # recv packets
-    data = bytes()
+def recv_header(socket: socket.socket) -> Union[Header, V2Header]:
+    """Next message header: Header for v1 senders, V2Header for v2."""
+    buf = bytearray(HEADER_SIZE)
+    _recv_into_or_fail(socket, memoryview(buf))
+    if buf[:len(V2_MAGIC)] == V2_MAGIC:
+        _, version, flags, features, size = struct.unpack(V2_HEADER_FMT, buf)
+        if version != V2_VERSION:
+            raise ValueError(f"unsupported protocol version {version}")
+        return V2Header(size, flags, features)
+    return unpack_header(buf)
+
+
+def _recv_scatter(socket: socket.socket, buffers: list):
+    """Fill `buffers` in order, up to SCATTER_BATCH of them per system call."""
+    i = 0
+    while i < len(buffers):
+        n = socket.recvmsg_into(buffers[i:i + SCATTER_BATCH])[0]
+        if not n:
+            raise ConnectionError("connection closed in the middle of a message")
+        while n:
+            size = len(buffers[i])
+            if n < size:
+                buffers[i] = buffers[i][n:]
+                break
+            n -= size
+            i += 1
+
+
+def _recv_payload_scatter(socket: socket.socket, header: Header, view: memoryview):
+    # Packets come in order and all but the last one are full (get_packets),
+    # so every packet's data slot in `view` is known before it arrives
+    batch = SCATTER_BATCH // 2
+    headers = bytearray(PACKET_HEADER_SIZE * batch)
+    headers_view = memoryview(headers)
+    padding = memoryview(bytearray(PACKET_DATA_SIZE))
+    for first in range(0, header.parts, batch):
+        count = min(batch, header.parts - first)
+        buffers = []
+        expected = []
+        for i in range(count):
+            part = first + i
+            offset = part * PACKET_DATA_SIZE
+            size = min(PACKET_DATA_SIZE, header.size - offset)
+            buffers.append(headers_view[i * PACKET_HEADER_SIZE:(i + 1) * PACKET_HEADER_SIZE])
+            buffers.append(view[offset:offset + size])
+            if size < PACKET_DATA_SIZE:
+                buffers.append(padding[:PACKET_DATA_SIZE - size])
+            expected.append((size, part))
+        _recv_scatter(socket, buffers)
+        for i, exp in enumerate(expected):
+            got = struct.unpack_from(PACKET_HEADER_FMT, headers, i * PACKET_HEADER_SIZE)
+            if got != exp:
+                raise ValueError(f"unexpected packet {got}, wanted {exp}")
+
+
+def recv_payload(socket: socket.socket, header: Header, view: memoryview):
+    """
+    Receive the packets of a message straight into `view` (len == header.size).
+    Each packet's data goes to its final offset with recv_into; only the
+    packet headers and the padding of a short last packet go to scratch
+    buffers. Where recvmsg_into exists, many packets are read per call.
+    """
+    if header.parts * PACKET_DATA_SIZE < header.size:
+        raise ValueError(f"{header.parts} parts cannot hold {header.size} bytes")
+    full_layout = header.parts == -(-header.size // PACKET_DATA_SIZE)
+    if full_layout and hasattr(socket, "recvmsg_into"):
+        _recv_payload_scatter(socket, header, view)
+        return
+
+    small = bytearray(max(PACKET_HEADER_SIZE, PACKET_DATA_SIZE))
+    small_view = memoryview(small)
     for _ in range(header.parts):
-        recv_packet = recvall(socket, PACKET_SIZE)
-        packet = unpack_packet(recv_packet)
-        data += packet.data
-
+        _recv_into_or_fail(socket, small_view[:PACKET_HEADER_SIZE])
+        size, part = struct.unpack_from(PACKET_HEADER_FMT, small)
+        offset = part * PACKET_DATA_SIZE
+        if size > PACKET_DATA_SIZE or offset + size > header.size:
+            raise ValueError(f"bad packet {part} of size {size}")
+        _recv_into_or_fail(socket, view[offset:offset + size])
+        if size < PACKET_DATA_SIZE:
+            _recv_into_or_fail(socket, small_view[:PACKET_DATA_SIZE - size])
+
+
+def _recv_frames(socket: socket.socket, view: memoryview):
+    """Receive v2 frames of a sized message straight into `view`."""
+    frame = bytearray(FRAME_SIZE)
+    frame_view = memoryview(frame)
+    packed = bytearray()
+    pos = 0
+    while pos < len(view):
+        _recv_into_or_fail(socket, frame_view)
+        flags, length = struct.unpack(FRAME_FMT, frame)
+        if not length or length > len(view) - pos:
+            raise ValueError(f"bad frame of {length} bytes at {pos}/{len(view)}")
+        if not flags:
+            _recv_into_or_fail(socket, view[pos:pos + length])
+            pos += length
+            continue
+        # Compressed frame: unpacked from a separate buffer
+        if length > len(packed):
+            packed = bytearray(length)
+        with memoryview(packed) as packed_view:
+            _recv_into_or_fail(socket, packed_view[:length])
+            data = _decompress(flags, packed_view[:length], len(view) - pos)
+        view[pos:pos + len(data)] = data
+        pos += len(data)
+
+
+def iter_frames(socket: socket.socket) -> Iterator[memoryview]:
+    """
+    Data of a v2 stream message (after its header), frame by frame. Each
+    view points into one reused buffer and is valid until the next frame.
+    """
+    frame = bytearray(FRAME_SIZE)
+    frame_view = memoryview(frame)
+    buffer = bytearray(MIN_CHUNK)
+    while True:
+        _recv_into_or_fail(socket, frame_view)
+        flags, length = struct.unpack(FRAME_FMT, frame)
+        if not length:
+            return
+        if length > MAX_CHUNK:
+            raise ValueError(f"frame of {length} bytes exceeds {MAX_CHUNK}")
+        if length > len(buffer):
+            buffer = bytearray(length)
+        view = memoryview(buffer)[:length]
+        _recv_into_or_fail(socket, view)
+        if flags:
+            yield memoryview(_decompress(flags, view, MAX_CHUNK))
+        else:
+            yield view
+
+
+def _recv_message_into(socket: socket.socket,
+                       header: Union[Header, V2Header],
+                       buffer: bytearray) -> memoryview:
+    if isinstance(header, V2Header):
+        if header.flags & MSG_HELLO:
+            raise ValueError("unexpected HELLO outside of negotiate()")
+        if header.flags & MSG_STREAM:
+            del buffer[:]
+            for frame in iter_frames(socket):
+                buffer += frame
+            return memoryview(buffer)
+    if len(buffer) < header.size:
+        buffer.extend(bytes(header.size - len(buffer)))
+    view = memoryview(buffer)[:header.size]
+    if isinstance(header, V2Header) and header.flags & MSG_RAW:
+        _recv_into_or_fail(socket, view)
+    elif isinstance(header, V2Header):
+        _recv_frames(socket, view)
+    else:
+        recv_payload(socket, header, view)
+    return view
+
+
+def recv_data(socket: socket.socket) -> bytearray:
+    """Next message, v1 or v2 (including stream messages)."""
+    header = recv_header(socket)
+    if isinstance(header, V2Header) and header.flags & (MSG_STREAM | MSG_HELLO):
+        data = bytearray()
+        _recv_message_into(socket, header, data).release()
+        return data
+    # Sized message: allocated once at its final size
+    data = bytearray(header.size)
+    _recv_message_into(socket, header, data).release()
     return data
 
 
+def recv_data_into(socket: socket.socket, buffer: bytearray) -> memoryview:
+    """
+    Like recv_data, but reuses `buffer` (grown when a message is larger)
+    and returns a view of the payload. The view is valid until the next
+    call with the same buffer.
+    """
+    return _recv_message_into(socket, recv_header(socket), buffer)
+
+
 def encode(string: str) -> bytes:
     return bytes(string, encoding="utf-8")
 
 
-def send_file(socket: socket.socket,
-              filepath: str, savepath: str):
-    send_data(socket, encode(f"SAVE_TO {savepath}"))
+def send_stream(socket: socket.socket, chunks: Iterable[bytes],
+                compressor: Optional["Compressor"] = None):
+    """Send a v2 stream message: one frame per chunk, then an empty frame."""
+    socket.sendall(pack_v2_header(0, MSG_STREAM))
+    for chunk in chunks:
+        if len(chunk):
+            _sendv(socket, _frame(chunk, compressor))
+    socket.sendall(struct.pack(FRAME_FMT, 0, 0))
+
+
+def read_chunks(f, chunk_size: int) -> Iterator[memoryview]:
+    """File contents in chunks read into one reused buffer."""
+    view = memoryview(bytearray(chunk_size))
+    while n := f.readinto(view):
+        yield view[:n]
+
 
+def send_file(socket: socket.socket,
+              filepath: str, savepath: str,
+              chunk_size: Optional[int] = None,
+              raw: bool = False,
+              compressor: Optional["Compressor"] = None):
+    """
+    v1 (default): one message per 1 KB chunk and an "EOF" message.
+    v2 (chunk_size given): the whole file as one stream message, with
+    compressed frames if a compressor is given (raw is ignored then).
+    raw (peer announced FEATURE_RAW): one MSG_RAW message whose body the
+    kernel copies from the file to the socket (socket.sendfile).
+    """
     with open(filepath, "rb") as f:
+        # Opened first: a missing file must not leave the peer waiting
+        send_data(socket, encode(f"SAVE_TO {savepath}"), chunk_size)
+        if raw and compressor is None:
+            size = os.fstat(f.fileno()).st_size
+            socket.sendall(pack_v2_header(size, MSG_RAW))
+            # Falls back to send() in Python where os.sendfile is missing
+            sent = socket.sendfile(f, 0, size)
+            if sent != size:
+                # The receiver still waits for `size` bytes: the stream is broken
+                raise ConnectionError(f"{filepath} shrank while sending "
+                                      f"({sent} of {size} bytes)")
+            return
+        if chunk_size:
+            send_stream(socket, read_chunks(f, chunk_size), compressor)
+            return
         while data := f.read(PACKET_DATA_SIZE):
             send_data(socket, data)
     send_data(socket, b"EOF")
 
 
-def recv_file(socket: socket.socket) -> str:
-    data = recv_data(socket).decode().split()
-    savepath = data[1]
-
-    with open(savepath, "wb") as f:
+def recv_to_file(socket: socket.socket, f, size: int,
+                 buffer_size: int = DEFAULT_CHUNK):
+    """Copy `size` bytes from the socket to file `f` through one buffer."""
+    view = memoryview(bytearray(max(1, min(size, buffer_size))))
+    left = size
+    while left:
+        n = socket.recv_into(view[:min(left, len(view))])
+        if not n:
+            raise ConnectionError(f"connection closed with {left} bytes left")
+        f.write(view[:n])
+        left -= n
+
+
+def save_path(root: str, relpath: str) -> str:
+    """`relpath` from the peer joined to `root`; refuses paths leading out of it."""
+    base = os.path.abspath(root)
+    path = os.path.normpath(os.path.join(base, relpath))
+    if os.path.isabs(relpath) or not path.startswith(base + os.sep):
+        raise ValueError(f"unsafe path from peer: {relpath!r}")
+    return path
+
+
+def _open_for_save(root: Optional[str], savepath: str):
+    if root is None:
+        return open(savepath, "wb"), savepath
+    path = save_path(root, savepath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb"), path
+
+
+def recv_file(socket: socket.socket, root: Optional[str] = None,
+              message: Optional[bytes] = None) -> str:
+    """
+    Receive a file sent by send_file. With `root` the path from the peer
+    is relative to it (directories are created); `message` is the
+    "SAVE_TO ..." message when the caller has already read it.
+    """
+    if message is None:
+        message = recv_data(socket)
+    # The path may contain spaces
+    command, savepath = bytes(message).decode().split(maxsplit=1)
+    if command != "SAVE_TO":
+        raise ValueError(f"expected SAVE_TO, got {command}")
+
+    f, savepath = _open_for_save(root, savepath)
+    with f:
+        header = recv_header(socket)
+        if isinstance(header, V2Header) and header.flags & MSG_RAW:
+            recv_to_file(socket, f, header.size)
+            return savepath
+        if isinstance(header, V2Header) and header.flags & MSG_STREAM:
+            for frame in iter_frames(socket):
+                f.write(frame)
+            return savepath
+
+        # v1: one message per chunk until "EOF"; one buffer for the whole
+        # file, chunks are written from it directly
+        buffer = bytearray(PACKET_DATA_SIZE)
         while True:
-            data = recv_data(socket)
+            data = _recv_message_into(socket, header, buffer)
             if data == b"EOF":
                 break
             f.write(data)
+            # Release the view so the buffer can grow for a larger message
+            data.release()
+            header = recv_header(socket)
+    return savepath
+
+
+def send_batch(socket: socket.socket, files: Iterable[tuple],
+               chunk_size: Optional[int] = None,
+               compressor: Optional["Compressor"] = None):
+    """
+    Several small files as two messages instead of a round of messages per
+    file. `files` are (savepath, data) pairs.
+    """
+    parts = []
+    for savepath, data in files:
+        path = encode(savepath)
+        parts += [struct.pack(BATCH_ENTRY_FMT, len(path), len(data)), path, data]
+    send_data(socket, encode(f"BATCH {len(parts) // 3}"), chunk_size)
+    send_data(socket, b"".join(parts), chunk_size, compressor)
+
+
+def recv_batch(socket: socket.socket, root: str,
+               message: Optional[bytes] = None) -> list:
+    """Save the files of a send_batch under `root`; returns (path, size) pairs."""
+    if message is None:
+        message = recv_data(socket)
+    command, count = bytes(message).decode().split()
+    if command != "BATCH":
+        raise ValueError(f"expected BATCH, got {command}")
+
+    data = recv_data(socket)
+    view = memoryview(data)
+    pos = 0
+    saved = []
+    made = set()
+    for _ in range(int(count)):
+        path_len, data_len = struct.unpack_from(BATCH_ENTRY_FMT, data, pos)
+        pos += BATCH_ENTRY_SIZE
+        relpath = bytes(view[pos:pos + path_len]).decode()
+        pos += path_len
+        path = save_path(root, relpath)
+        folder = os.path.dirname(path)
+        if folder not in made:
+            os.makedirs(folder, exist_ok=True)
+            made.add(folder)
+        with open(path, "wb") as f:
+            f.write(view[pos:pos + data_len])
+        pos += data_len
+        saved.append((path, data_len))
+    view.release()
+    if pos != len(data):
+        raise ValueError(f"batch has {len(data) - pos} stray bytes")
+    return saved
+
+
+# --- Compression ---
+
+class TransferStats:
+    """Bytes before and after compression and CPU time spent compressing."""
+    def __init__(self):
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.chunks = 0
+        self.compressed = 0
+        self.cpu = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, raw: int, sent: int, cpu: float):
+        with self.lock:
+            self.raw_bytes += raw
+            self.sent_bytes += sent
+            self.chunks += 1
+            self.compressed += sent < raw
+            self.cpu += cpu
+
+    @property
+    def ratio(self) -> float:
+        return self.sent_bytes / self.raw_bytes if self.raw_bytes else 1.0
+
+    def __str__(self):
+        return (f"{self.raw_bytes / 2**20:.1f} MB -> {self.sent_bytes / 2**20:.1f} MB "
+                f"(ratio {self.ratio:.2f}), {self.compressed}/{self.chunks} chunks "
+                f"compressed, CPU {self.cpu:.2f} s")
+
+
+class Compressor:
+    """
+    Compresses v2 frames one chunk at a time. Chunks that do not shrink are
+    sent as is, and after such a chunk the next ones are not even tried
+    (already compressed files cost almost no CPU).
+    """
+    def __init__(self, method: str = "zlib", level: int = 6,
+                 stats: Optional[TransferStats] = None):
+        if method == "zlib":
+            self.flag, self.feature = FRAME_ZLIB, FEATURE_ZLIB
+            self._compress = lambda data: zlib.compress(data, level)
+        elif method == "lzma" and lzma is not None:
+            self.flag, self.feature = FRAME_LZMA, FEATURE_LZMA
+            self._compress = lambda data: lzma.compress(data, preset=level)
+        else:
+            raise ValueError(f"unsupported compression {method!r}")
+        self.stats = stats if stats is not None else TransferStats()
+        self.skip = 0
+        self.backoff = 1
+
+    def pack(self, chunk: memoryview) -> tuple:
+        """(frame flags, frame data) for one chunk."""
+        if self.skip:
+            self.skip -= 1
+            self.stats.add(len(chunk), len(chunk), 0.0)
+            return 0, chunk
+        t = time.thread_time()
+        packed = self._compress(chunk)
+        cpu = time.thread_time() - t
+        if len(packed) < len(chunk) * MAX_RATIO:
+            self.backoff = 1
+            self.stats.add(len(chunk), len(packed), cpu)
+            return self.flag, packed
+        self.skip = self.backoff
+        self.backoff = min(self.backoff * 2, MAX_SKIP)
+        self.stats.add(len(chunk), len(chunk), cpu)
+        return 0, chunk
+
+
+def _frame(chunk: memoryview, compressor: Optional[Compressor]) -> list:
+    flags, data = compressor.pack(chunk) if compressor else (0, chunk)
+    return [struct.pack(FRAME_FMT, flags, len(data)), data]
+
+
+def _decompress(flags: int, data: memoryview, limit: int) -> bytes:
+    """Data of a compressed frame; at most `limit` bytes are accepted."""
+    if flags == FRAME_ZLIB:
+        d = zlib.decompressobj()
+    elif flags == FRAME_LZMA and lzma is not None:
+        d = lzma.LZMADecompressor()
+    else:
+        raise ValueError(f"unsupported frame flags {flags:#x}")
+    out = d.decompress(data, limit + 1)
+    if not d.eof or not out or len(out) > limit:
+        raise ValueError(f"bad compressed frame (limit {limit} bytes)")
+    return out
+
+
+# --- Resumable transfers ---
+
+def _bitmap(done: set, parts: int) -> bytearray:
+    bitmap = bytearray((parts + 7) // 8)
+    for part in done:
+        bitmap[part >> 3] |= 0x80 >> (part & 7)
+    return bitmap
+
+
+def _missing(bitmap: bytes, parts: int) -> list:
+    return [part for part in range(parts)
+            if not bitmap[part >> 3] & (0x80 >> (part & 7))]
+
+
+def send_file_resumable(socket: socket.socket, filepath: str, savepath: str,
+                        part_size: int = PART_SIZE) -> int:
+    """
+    Send a file in CRC32-checked parts, skipping the parts the receiver
+    already has from an interrupted transfer. Returns bytes actually sent.
+    """
+    with open(filepath, "rb") as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        parts = -(-size // part_size)
+        send_data(socket, encode(f"RESUME {size} {part_size} {st.st_mtime_ns} {savepath}"))
+
+        view = memoryview(bytearray(part_size))
+        sent = 0
+        for _ in range(MAX_ROUNDS):
+            missing = _missing(recv_data(socket), parts)
+            if not missing:
+                return sent
+            for part in missing:
+                f.seek(part * part_size)
+                n = f.readinto(view)
+                if n != min(part_size, size - part * part_size):
+                    raise ConnectionError(f"{filepath} changed while sending")
+                data = view[:n]
+                _sendv(socket, [pack_v2_header(PART_HEADER_SIZE + n, MSG_RAW),
+                                struct.pack(PART_FMT, part, zlib.crc32(data)), data])
+                sent += n
+        if _missing(recv_data(socket), parts):
+            send_data(socket, ABORT)
+            raise ConnectionError(f"{filepath}: parts still fail after {MAX_ROUNDS} rounds")
+        return sent
+
+
+def _load_manifest(manifest_path: str, key: dict) -> set:
+    """Parts saved by an earlier attempt of the same file version."""
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if any(manifest.get(k) != v for k, v in key.items()):
+        return set()
+    return set(manifest.get("done", ()))
+
+
+def _save_manifest(f, manifest_path: str, key: dict, done: set):
+    # The parts must be on disk before the manifest lists them
+    f.flush()
+    os.fsync(f.fileno())
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w") as m:
+        json.dump(dict(key, done=sorted(done)), m)
+    os.replace(tmp, manifest_path)
+
+
+def recv_file_resumable(socket: socket.socket, root: Optional[str] = None,
+                        message: Optional[bytes] = None) -> str:
+    """
+    Receive a file sent by send_file_resumable. Data goes to "<path>.part"
+    and the finished parts are listed in "<path>.part.json", so a new
+    transfer of the same file continues where the last one stopped.
+    """
+    if message is None:
+        message = recv_data(socket)
+    command, size, part_size, mtime_ns, savepath = bytes(message).decode().split(maxsplit=4)
+    if command != "RESUME":
+        raise ValueError(f"expected RESUME, got {command}")
+    size, part_size = int(size), int(part_size)
+    if not 0 < part_size <= MAX_CHUNK:
+        raise ValueError(f"bad part size {part_size}")
+
+    if root is not None:
+        savepath = save_path(root, savepath)
+        os.makedirs(os.path.dirname(savepath), exist_ok=True)
+    partial = savepath + PARTIAL_SUFFIX
+    manifest_path = savepath + MANIFEST_SUFFIX
+    mtime_ns = int(mtime_ns)
+    key = {"size": size, "part_size": part_size, "mtime_ns": mtime_ns}
+    parts = -(-size // part_size)
+    if _is_saved(savepath, size, mtime_ns):
+        # Finished by an earlier backup: nothing is missing
+        send_data(socket, _bitmap(range(parts), parts))
+        return savepath
+    done = _load_manifest(manifest_path, key) if os.path.exists(partial) else set()
+
+    with open(partial, "r+b" if done else "wb") as f:
+        f.truncate(size)
+        part_header = bytearray(PART_HEADER_SIZE)
+        view = memoryview(bytearray(part_size))
+        saved_at = time.monotonic()
+        try:
+            while True:
+                send_data(socket, _bitmap(done, parts))
+                missing = parts - len(done)
+                if not missing:
+                    break
+                for _ in range(missing):
+                    header = recv_header(socket)
+                    if not isinstance(header, V2Header) or not header.flags & MSG_RAW:
+                        if bytes(_recv_message_into(socket, header, bytearray())) == ABORT:
+                            raise ConnectionError(f"{savepath}: the sender gave up")
+                        raise ValueError("expected a file part")
+                    if not PART_HEADER_SIZE <= header.size <= PART_HEADER_SIZE + part_size:
+                        raise ValueError("expected a file part")
+                    _recv_into_or_fail(socket, memoryview(part_header))
+                    part, crc = struct.unpack(PART_FMT, part_header)
+                    data = view[:header.size - PART_HEADER_SIZE]
+                    _recv_into_or_fail(socket, data)
+                    # A damaged part stays missing and is asked for again
+                    if (part >= parts or len(data) != min(part_size, size - part * part_size)
+                            or zlib.crc32(data) != crc):
+                        continue
+                    f.seek(part * part_size)
+                    f.write(data)
+                    done.add(part)
+                    if time.monotonic() - saved_at >= MANIFEST_EVERY:
+                        _save_manifest(f, manifest_path, key, done)
+                        saved_at = time.monotonic()
+        finally:
+            if len(done) < parts:
+                _save_manifest(f, manifest_path, key, done)
+
+    os.replace(partial, savepath)
+    os.utime(savepath, ns=(mtime_ns, mtime_ns))
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
     return savepath
+
+
+def _is_saved(path: str, size: int, mtime_ns: int) -> bool:
+    """The file is already there, as saved from the same version."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_size == size and st.st_mtime_ns == mtime_ns
+
+
+def send_batch_resumable(socket: socket.socket, files: Iterable[tuple],
+                         chunk_size: Optional[int] = None,
+                         compressor: Optional["Compressor"] = None) -> list:
+    """
+    send_batch for (savepath, filepath) pairs that skips the files the
+    receiver already has from an earlier backup; only the files it lacks
+    are read. Returns (savepath, size) of the files actually sent.
+    """
+    listing = []
+    for savepath, filepath in files:
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            continue
+        listing.append((savepath, filepath, st.st_size, st.st_mtime_ns))
+    entries = []
+    for savepath, _, size, mtime_ns in listing:
+        path = encode(savepath)
+        entries += [struct.pack(LISTING_ENTRY_FMT, len(path), size, mtime_ns), path]
+    send_data(socket, encode(f"RESUME_BATCH {len(listing)}"), chunk_size)
+    send_data(socket, b"".join(entries), chunk_size)
+
+    have = recv_data(socket)
+    batch = []
+    for i in _missing(have, len(listing)):
+        savepath, filepath = listing[i][:2]
+        try:
+            with open(filepath, "rb") as f:
+                batch.append((savepath, f.read()))
+        except FileNotFoundError:
+            pass    # the receiver just does not get it
+    send_batch(socket, batch, chunk_size, compressor)
+    return [(savepath, len(data)) for savepath, data in batch]
+
+
+def recv_batch_resumable(socket: socket.socket, root: str,
+                         message: Optional[bytes] = None) -> list:
+    """
+    Receive a send_batch_resumable under `root`: the saved files get the
+    sender's mtime. Returns (path, size) of the files received.
+    """
+    if message is None:
+        message = recv_data(socket)
+    command, count = bytes(message).decode().split()
+    if command != "RESUME_BATCH":
+        raise ValueError(f"expected RESUME_BATCH, got {command}")
+
+    data = recv_data(socket)
+    pos = 0
+    mtimes = {}
+    have = set()
+    for i in range(int(count)):
+        path_len, size, mtime_ns = struct.unpack_from(LISTING_ENTRY_FMT, data, pos)
+        pos += LISTING_ENTRY_SIZE
+        path = save_path(root, bytes(data[pos:pos + path_len]).decode())
+        pos += path_len
+        mtimes[path] = mtime_ns
+        if _is_saved(path, size, mtime_ns):
+            have.add(i)
+    if pos != len(data):
+        raise ValueError(f"listing has {len(data) - pos} stray bytes")
+    send_data(socket, _bitmap(have, int(count)))
+
+    saved = recv_batch(socket, root)
+    for path, _ in saved:
+        if path not in mtimes:
+            raise ValueError(f"{path} was not in the listing")
+        os.utime(path, ns=(mtimes[path], mtimes[path]))
+    return saved
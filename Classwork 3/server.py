@@ -1,38 +1,207 @@
 import logging
 
 logging.basicConfig(level=logging.INFO,
-                    format="[%(level)s] :: %(asctime)s : %(message)s")
+                    format="[%(levelname)s] :: %(asctime)s : %(message)s")
 logger = logging.getLogger(__name__)
 
+import select
+import socket
 import socketserver
+import threading
+import time
 from packet_stream import send_data, recv_data
-from packet_stream import encode
+from packet_stream import negotiate
+
+ROLES = ("sender", "recver")
+# Seconds a client waits for the other side of its session
+PAIR_TIMEOUT = 600
+# Seconds between checks that a waiting client is still connected
+POLL_INTERVAL = 1.0
+# Bytes moved per recv/send while relaying
+RELAY_BUFFER = 256 * 1024
+
+
+class Pair:
+    """Sender and receiver of one backup session."""
+    def __init__(self, session: str):
+        self.session = session
+        self.sockets = {}
+        self.paired = False
+        # Set when pairing is over, also when it failed
+        self.ready = threading.Event()
+        self.failed = False
+        # The waiting client has been sent WAIT (READY must come after it)
+        self.announced = threading.Event()
+        # Both relay directions finish before either socket is closed
+        self.done = threading.Barrier(2)
+
+    def peer(self, role: str) -> socket.socket:
+        other, = (r for r in ROLES if r != role)
+        return self.sockets[other]
+
+
+def pipe(src: socket.socket, dst: socket.socket) -> int:
+    """
+    Copy bytes src -> dst until src closes. The bytes are forwarded as they
+    are, frames are not decoded. While sendall to a slow receiver blocks,
+    nothing is read from src, so TCP slows the sender down (backpressure).
+    """
+    view = memoryview(bytearray(RELAY_BUFFER))
+    total = 0
+    while n := src.recv_into(view):
+        dst.sendall(view[:n])
+        total += n
+    dst.shutdown(socket.SHUT_WR)
+    return total
+
+
+def is_closed(sock: socket.socket) -> bool:
+    """True if the client has disconnected (it sends nothing while waiting)."""
+    readable, _, _ = select.select([sock], [], [], 0)
+    if not readable:
+        return False
+    try:
+        return not sock.recv(1, socket.MSG_PEEK)
+    except OSError:
+        return True
+
+
+class RelayServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, handler):
+        super().__init__(address, handler)
+        self.pairs = {}                 # session -> Pair still waiting
+        self.lock = threading.Lock()
+
+    def join(self, session: str, role: str, request: socket.socket):
+        """
+        Pair for the session; None if the role is already taken. A second
+        client whose waiting peer turns out to be gone waits in its place.
+        """
+        while True:
+            with self.lock:
+                pair = self.pairs.get(session)
+                if pair is None:
+                    pair = self.pairs[session] = Pair(session)
+                if role in pair.sockets:
+                    return None
+                pair.sockets[role] = request
+                complete = len(pair.sockets) == 2
+                if complete:
+                    pair.paired = True
+                    # The session ID is free for the next backup
+                    del self.pairs[session]
+
+            if not complete:
+                try:
+                    send_data(request, b"WAIT")
+                except OSError:
+                    pass    # wait() notices the closed socket
+                finally:
+                    pair.announced.set()
+                return pair
+
+            # Both clients get READY before either direction starts relaying
+            pair.announced.wait(PAIR_TIMEOUT)
+            try:
+                waiter = pair.peer(role)
+                # A send to a socket the client has closed may still succeed
+                if is_closed(waiter):
+                    raise ConnectionError("waiting client disconnected")
+                send_data(waiter, b"READY")
+            except OSError:
+                logger.info("SESSION %s: waiting peer is gone", session)
+                pair.failed = True
+                pair.ready.set()
+                continue
+            try:
+                send_data(request, b"READY")
+            except OSError:
+                pair.failed = True
+                raise
+            finally:
+                pair.ready.set()
+            return pair
+
+    def wait(self, pair: Pair, role: str) -> bool:
+        """Waits for the other client; False if it did not come or we left."""
+        deadline = time.monotonic() + PAIR_TIMEOUT
+        request = pair.sockets[role]
+        while not pair.ready.wait(POLL_INTERVAL):
+            if time.monotonic() < deadline and not is_closed(request):
+                continue
+            if self.leave(pair, role):
+                return False
+            # Paired meanwhile: READY is being sent
+            pair.ready.wait(PAIR_TIMEOUT)
+            break
+        return pair.ready.is_set() and not pair.failed
+
+    def leave(self, pair: Pair, role: str) -> bool:
+        """Removes a client that is still unpaired; False if it got paired."""
+        with self.lock:
+            if pair.paired:
+                return False
+            pair.sockets.pop(role, None)
+            if not pair.sockets and self.pairs.get(pair.session) is pair:
+                del self.pairs[pair.session]
+            return True
 
 
 class BackupServer(socketserver.BaseRequestHandler):
     def handle(self) -> None:
+        logger.info("CLIENT %s connected", self.client_address)
         try:
-            self.clients.append(self.request)
-        except:
-            self.clients = [self.request]
-        print(f"CLIENT: {self.request} connected")
-
-        if len(self.clients) == 2:
-            for c in self.clients:
-                send_data(c, b"READY")
-            self.start_backup()
-        else:
-            send_data(self.clients[0], b"WAIT")
-
-    def start_backup(self):
-        sender, reciver = self.clients
-        while True:
-            data = recv_data(sender)
-            send_data(reciver, data)
+            negotiate(self.request)
+            # JOIN <session> <role>
+            command, session, role = recv_data(self.request).decode().split()
+            if command != "JOIN" or role not in ROLES:
+                raise ValueError(f"expected JOIN <session> <role>, got {command}")
+        except (OSError, ValueError) as e:
+            logger.warning("CLIENT %s: bad handshake (%s)", self.client_address, e)
+            return
+
+        try:
+            pair = self.server.join(session, role, self.request)
+        except OSError as e:
+            logger.warning("SESSION %s: %s is gone (%s)", session, role, e)
+            return
+        if pair is None:
+            send_data(self.request, b"BUSY")
+            logger.warning("SESSION %s: %s already connected", session, role)
+            return
+        if not pair.ready.is_set() and not self.server.wait(pair, role):
+            if not pair.failed and not is_closed(self.request):
+                send_data(self.request, b"TIMEOUT")
+            logger.info("SESSION %s: %s stopped waiting", session, role)
+            return
+        if pair.failed:
+            return
+
+        logger.info("SESSION %s: relaying from %s", session, role)
+        peer = pair.peer(role)
+        try:
+            total = pipe(self.request, peer)
+            logger.info("SESSION %s: %s sent %d bytes", session, role, total)
+        except OSError as e:
+            logger.warning("SESSION %s: %s relay failed (%s)", session, role, e)
+            # Wake the other direction up
+            for s in (self.request, peer):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        finally:
+            try:
+                pair.done.wait(PAIR_TIMEOUT)
+            except threading.BrokenBarrierError:
+                pass
 
 
 if __name__ == "__main__":
     HOST, PORT = "localhost", 9999
-    with socketserver.TCPServer((HOST, PORT), BackupServer) as server:
+    with RelayServer((HOST, PORT), BackupServer) as server:
         print("SERVER STARTED")
-        server.serve_forever()
\ No newline at end of file
+        server.serve_forever()
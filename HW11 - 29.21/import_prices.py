@@ -0,0 +1,228 @@
+# import_prices.py
+"""
+Масове завантаження прайс-листів у tender.db.
+
+Файл CSV або XLSX із заголовком; обов'язкові стовпці supplier_id,
+product_id, price, необов'язкові — supplier_name, rating, address,
+product_name, term. Рядки читаються потоково і записуються пакетами
+(INSERT ... ON CONFLICT), тож пам'ять не залежить від розміру файлу.
+
+Використання:
+    python import_prices.py prices.csv [--db tender.db] [--batch 50000]
+"""
+import argparse
+import csv
+import math
+import sqlite3
+import sys
+import time
+
+from tender_engine import install, suspend, resume
+
+DB_FILE = 'tender.db'
+BATCH_SIZE = 50000
+MAX_ERRORS = 100
+
+REQUIRED = ('supplier_id', 'product_id', 'price')
+
+UPSERT_SUPPLIER = """
+INSERT INTO suppliers(id,name,rating,address) VALUES (?,?,?,?)
+ON CONFLICT(id) DO UPDATE SET
+  name    = excluded.name,
+  rating  = excluded.rating,
+  address = COALESCE(excluded.address, address)
+"""
+UPSERT_PRODUCT = """
+INSERT INTO products(id,name) VALUES (?,?)
+ON CONFLICT(id) DO UPDATE SET name = excluded.name
+"""
+UPSERT_PRICE = """
+INSERT INTO prices(supplier_id,product_id,price,term) VALUES (?,?,?,?)
+ON CONFLICT(supplier_id,product_id) DO UPDATE SET
+  price = excluded.price,
+  term  = COALESCE(excluded.term, term)
+"""
+
+
+class ImportStats:
+    __slots__ = ('rows', 'imported', 'errors', 'messages', 'started')
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.errors = 0
+        self.messages = []
+        self.started = time.perf_counter()
+
+    def error(self, line, msg):
+        self.errors += 1
+        if len(self.messages) < MAX_ERRORS:
+            self.messages.append(f"рядок {line}: {msg}")
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def __str__(self):
+        rate = self.rows / self.elapsed if self.elapsed else 0.0
+        return (f"оброблено {self.rows}, імпортовано {self.imported}, "
+                f"помилок {self.errors} ({rate:.0f} рядків/с)")
+
+
+def _check_header(names):
+    missing = [c for c in REQUIRED if c not in (names or ())]
+    if missing:
+        raise ValueError("Немає стовпців: " + ", ".join(missing))
+
+
+def iter_csv(stream):
+    """(номер рядка, словник) для кожного запису CSV; stream — текстовий потік."""
+    reader = csv.DictReader(stream)
+    _check_header(reader.fieldnames)
+    # line_num — рядок файлу, на якому закінчився запис (поле в лапках
+    # може займати кілька рядків)
+    for rec in reader:
+        yield reader.line_num, rec
+
+
+def iter_xlsx(fileobj):
+    """(номер рядка, словник) для першого аркуша XLSX (потрібен openpyxl)."""
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("Для XLSX потрібен пакет openpyxl")
+    wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+        _check_header(header)
+        for line, values in enumerate(rows, start=2):
+            yield line, {k: v for k, v in zip(header, values) if k}
+    finally:
+        wb.close()
+
+
+def _text(v):
+    if v is None:
+        return None
+    v = str(v).strip()
+    return v or None
+
+
+def _parse(rec):
+    """Рядок файлу -> (supplier, product, price) або ValueError."""
+    sid = _text(rec.get('supplier_id'))
+    pid = _text(rec.get('product_id'))
+    if not sid or not pid:
+        raise ValueError("порожній supplier_id або product_id")
+    price = float(rec.get('price'))
+    # nan пройшов би порівняння і став би NULL у NOT NULL стовпці
+    if not (math.isfinite(price) and price > 0):
+        raise ValueError("ціна має бути додатним числом")
+    term = _text(rec.get('term'))
+    if term is not None:
+        term = float(term)
+        if not math.isfinite(term):
+            raise ValueError("термін має бути числом")
+        term = int(term)
+
+    supplier = None
+    rating = _text(rec.get('rating'))
+    if rating is not None:
+        rating = float(rating)
+        if not math.isfinite(rating):
+            raise ValueError("рейтинг має бути числом")
+        supplier = (sid, _text(rec.get('supplier_name')) or sid,
+                    rating, _text(rec.get('address')))
+    product = None
+    pname = _text(rec.get('product_name'))
+    if pname is not None:
+        product = (pid, pname)
+    return supplier, product, (sid, pid, price, term)
+
+
+def _flush(conn, suppliers, products, prices):
+    with conn:
+        if suppliers:
+            conn.executemany(UPSERT_SUPPLIER, suppliers.values())
+        if products:
+            conn.executemany(UPSERT_PRODUCT, products.values())
+        conn.executemany(UPSERT_PRICE, prices)
+
+
+def iter_import(conn, rows, batch_size=BATCH_SIZE):
+    """
+    Записує рядки (пари (номер рядка, словник) з iter_csv/iter_xlsx)
+    пакетами по batch_size, кожен в окремій транзакції, і після кожного
+    пакета віддає поточну статистику (ImportStats).
+    Тригери best_offers і індекс prices вимкнені до кінця імпорту.
+    """
+    stats = ImportStats()
+    install(conn)
+    suspend(conn)
+    try:
+        suppliers, products, prices = {}, {}, []
+        for line, rec in rows:
+            stats.rows += 1
+            try:
+                sup, prod, price = _parse(rec)
+            except (TypeError, ValueError) as e:
+                stats.error(line, e)
+                continue
+            # У межах пакета достатньо останнього запису для ключа
+            if sup:
+                suppliers[sup[0]] = sup
+            if prod:
+                products[prod[0]] = prod
+            prices.append(price)
+            if len(prices) >= batch_size:
+                _flush(conn, suppliers, products, prices)
+                stats.imported += len(prices)
+                suppliers, products, prices = {}, {}, []
+                yield stats
+        if prices:
+            _flush(conn, suppliers, products, prices)
+            stats.imported += len(prices)
+        yield stats
+    finally:
+        resume(conn)
+
+
+def import_rows(conn, rows, batch_size=BATCH_SIZE, progress=None):
+    """Те саме, що iter_import; progress(stats) — після кожного пакета."""
+    stats = None
+    for stats in iter_import(conn, rows, batch_size):
+        if progress:
+            progress(stats)
+    return stats
+
+
+def open_rows(path):
+    if path.lower().endswith('.xlsx'):
+        yield from iter_xlsx(path)
+        return
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        yield from iter_csv(f)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Імпорт прайс-листа в tender.db")
+    ap.add_argument('file', help="CSV або XLSX")
+    ap.add_argument('--db', default=DB_FILE)
+    ap.add_argument('--batch', type=int, default=BATCH_SIZE)
+    args = ap.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        stats = import_rows(conn, open_rows(args.file), args.batch,
+                            progress=lambda s: print(s, file=sys.stderr))
+    finally:
+        conn.close()
+    for msg in stats.messages:
+        print(msg, file=sys.stderr)
+    print(f"Готово: {stats}")
+    return 0 if stats.imported else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,8 @@
 import sqlite3
 from pathlib import Path
 
+from tender_engine import install
+
 DB_FILE = 'tender.db'
 
 # Якщо є стара БД — видалимо, щоб стартувати з чистого аркуша
@@ -79,6 +81,9 @@ cur.executemany(
 # 3) Ініціалізуємо коефіцієнти a1,a2 (за замовчуванням 0.5 і 0.5)
 cur.execute("INSERT INTO coeffs(a1,a2) VALUES (0.5,0.5)")
 
+# 4) Таблиця переможців і тригери, що її підтримують
+install(conn)
+
 conn.commit()
 conn.close()
 
@@ -1,10 +1,33 @@
 import sqlite3, html
+import io, shutil, tempfile
 from wsgiref.simple_server import make_server
 from urllib.parse import parse_qs
 import os
+import threading
+
+from tender_engine import install, refresh_best, tender_etag, tender_rows
+from import_prices import iter_csv, iter_xlsx, iter_import
 
 DB_FILE = 'tender.db'
 
+# Застосунок можна запускати в багатопотоковому wsgi_server.py без
+# додаткового блокування: з'єднання з БД у кожного потоку свої
+WSGI_THREAD_SAFE = True
+
+# Кожен потік сервера тримає власне з'єднання (sqlite3 не дозволяє ділити
+# одне з'єднання між потоками); схема перевіряється один раз на процес.
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+# Остання зібрана сторінка результатів: (etag, bytes)
+_tender_page = (None, b'')
+
+# Одночасно виконується не більше одного імпорту
+_import_lock = threading.Lock()
+
+XLSX_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
 def ensure_db():
     # Якщо є файл, але він не читається як SQLite – видалити
     if os.path.exists(DB_FILE):
@@ -51,10 +74,30 @@ def ensure_db():
     if cur.fetchone()[0] == 0:
         cur.execute("INSERT INTO coeffs(a1,a2) VALUES(0.5,0.5)")
     conn.commit()
+    install(conn)
+    conn.commit()
+    # WAL: читачі не блокують запис і навпаки (режим зберігається у файлі БД)
+    conn.execute("PRAGMA journal_mode=WAL")
     conn.close()
 
+def init_db():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            ensure_db()
+            _schema_ready = True
+
 def get_conn():
-    return sqlite3.connect(DB_FILE)
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        init_db()
+        # cached_statements — кеш підготовлених запитів з'єднання
+        conn = sqlite3.connect(DB_FILE, timeout=10, cached_statements=256)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
 
 def get_params(env):
     if env['REQUEST_METHOD']=='GET':
@@ -64,6 +107,23 @@ def get_params(env):
         data = env['wsgi.input'].read(size).decode('utf-8')
         return parse_qs(data, keep_blank_values=True)
 
+class BodyReader(io.RawIOBase):
+    """Тіло запиту як потік: читає wsgi.input не далі CONTENT_LENGTH."""
+    def __init__(self, env):
+        self.src  = env['wsgi.input']
+        self.left = int(env.get('CONTENT_LENGTH','0') or 0)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.left <= 0:
+            return 0
+        data = self.src.read(min(len(b), self.left))
+        b[:len(data)] = data
+        self.left -= len(data)
+        return len(data)
+
 def render(body: str) -> bytes:
     page = (
         "<!doctype html><html><head><meta charset='utf-8'>"
@@ -72,15 +132,80 @@ def render(body: str) -> bytes:
         "<a href='/'>Головна</a> | "
         "<a href='/coeffs'>Коефіцієнти</a> | "
         "<a href='/add_item'>Додати товар</a> | "
-        "<a href='/tender'>Результати</a>"
+        "<a href='/tender'>Результати</a> | "
+        "<a href='/import'>Імпорт цін</a>"
         "</nav><hr>"
         f"{body}</body></html>"
     )
     return page.encode('utf-8')
 
+def import_app(env, start_response):
+    if env['REQUEST_METHOD']=='GET':
+        start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
+        # Файл відправляється тілом запиту як є, без multipart
+        body = """
+        <h2>Імпорт прайс-листа (CSV/XLSX)</h2>
+        <p>Стовпці: supplier_id, product_id, price; необов'язкові —
+           supplier_name, rating, address, product_name, term.</p>
+        <input type="file" id="f" accept=".csv,.xlsx">
+        <button onclick="send()">Завантажити</button>
+        <pre id="log"></pre>
+        <script>
+        async function send() {
+          const f = document.getElementById('f').files[0];
+          if (!f) return;
+          const log = document.getElementById('log');
+          const r = await fetch('/import', {method: 'POST', body: f,
+            headers: {'Content-Type': f.type || 'text/csv'}});
+          const rd = r.body.getReader(), dec = new TextDecoder();
+          for (;;) {
+            const {done, value} = await rd.read();
+            if (done) break;
+            log.textContent += dec.decode(value, {stream: true});
+          }
+        }
+        </script>
+        """
+        return [render(body)]
+
+    if not _import_lock.acquire(blocking=False):
+        start_response("409 Conflict", [("Content-Type","text/plain; charset=utf-8")])
+        return ["Імпорт уже виконується.\n".encode('utf-8')]
+
+    def run():
+        try:
+            src = BodyReader(env)
+            if env.get('CONTENT_TYPE','').startswith(XLSX_TYPE):
+                # openpyxl потребує файлу з seek(): тіло йде на диск, не в пам'ять
+                tmp = tempfile.TemporaryFile()
+                shutil.copyfileobj(src, tmp, 1 << 20)
+                tmp.seek(0)
+                rows = iter_xlsx(tmp)
+            else:
+                rows = iter_csv(io.TextIOWrapper(io.BufferedReader(src, 1 << 16),
+                                                 encoding='utf-8-sig', newline=''))
+            stats = None
+            try:
+                for stats in iter_import(get_conn(), rows):
+                    yield f"{stats}\n".encode('utf-8')
+            except (ValueError, RuntimeError) as e:
+                yield f"Помилка: {e}\n".encode('utf-8')
+                return
+            for msg in stats.messages:
+                yield f"{msg}\n".encode('utf-8')
+            yield f"Готово: {stats}\n".encode('utf-8')
+        finally:
+            _import_lock.release()
+
+    # Прогрес віддається по мірі запису пакетів
+    start_response("200 OK", [("Content-Type","text/plain; charset=utf-8")])
+    return run()
+
 def application(env, start_response):
-    ensure_db()
     path   = env.get('PATH_INFO','/')
+    # Тіло імпорту читається потоково, тому до get_params()
+    if path=='/import':
+        return import_app(env, start_response)
     params = get_params(env)
     def G(k): return params.get(k, [None])[0]
 
@@ -92,10 +217,9 @@ def application(env, start_response):
 
     # --- Коефіцієнти ---
     if path=='/coeffs':
-        conn = get_conn(); cur = conn.cursor()
+        conn = get_conn()
         if env['REQUEST_METHOD']=='GET':
-            cur.execute("SELECT a1,a2 FROM coeffs")
-            a1,a2 = cur.fetchone()
+            a1,a2 = conn.execute("SELECT a1,a2 FROM coeffs").fetchone()
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             body = f"""
             <h2>Коефіцієнти (a1+a2=1)</h2>
@@ -105,14 +229,15 @@ def application(env, start_response):
               <input type="submit" value="Зберегти">
             </form>
             """
-            conn.close()
             return [render(body)]
         # POST
         try:
             a1 = float(G('a1')); a2 = float(G('a2'))
             assert abs((a1+a2)-1.0)<1e-6
-            cur.execute("UPDATE coeffs SET a1=?, a2=?", (a1,a2))
-            conn.commit()
+            with conn:
+                conn.execute("UPDATE coeffs SET a1=?, a2=?", (a1,a2))
+                # Змінились ваги — переможці могли змінитися для всіх товарів
+                refresh_best(conn)
             start_response("302 Found", [("Location","/coeffs")])
             return [b'']
         except:
@@ -121,11 +246,10 @@ def application(env, start_response):
 
     # --- Додати товар у тендер ---
     if path=='/add_item':
-        conn = get_conn(); cur = conn.cursor()
-        # Завантажуємо список продуктів
-        cur.execute("SELECT id,name FROM products")
-        prods = cur.fetchall()
+        conn = get_conn()
         if env['REQUEST_METHOD']=='GET':
+            # Завантажуємо список продуктів
+            prods = conn.execute("SELECT id,name FROM products").fetchall()
             opts = "".join(f"<option value='{pid}'>{html.escape(name)}</option>"
                            for pid,name in prods)
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
@@ -137,15 +261,14 @@ def application(env, start_response):
               <input type="submit" value="Додати">
             </form>
             """
-            conn.close()
             return [render(body)]
         # POST
         pid = G('prod'); q = G('qty')
         try:
             qty = float(q); assert pid
-            cur.execute("INSERT INTO tender_items(product_id,quantity) VALUES(?,?)",
-                        (pid,qty))
-            conn.commit()
+            with conn:
+                conn.execute("INSERT INTO tender_items(product_id,quantity) VALUES(?,?)",
+                             (pid,qty))
             start_response("302 Found",[("Location","/add_item")])
             return [b'']
         except:
@@ -154,65 +277,65 @@ def application(env, start_response):
 
     # --- Показати результати тендеру ---
     if path=='/tender':
-        conn = get_conn(); cur = conn.cursor()
-        # Зчитуємо дані
-        cur.execute("SELECT a1,a2 FROM coeffs"); a1,a2 = cur.fetchone()
-        cur.execute("SELECT id,name,rating FROM suppliers")
-        sups = cur.fetchall()
-        cur.execute("SELECT supplier_id,product_id,price FROM prices")
-        prs = cur.fetchall()
-        cur.execute("SELECT id,name FROM products")
-        prds = cur.fetchall()
-        cur.execute("SELECT product_id,quantity FROM tender_items")
-        items = cur.fetchall()
-        conn.close()
-
-        # Знаходимо Pmax та Rmax
-        from collections import defaultdict
-        Pmax = defaultdict(float)
-        for sid,pid,price in prs:
-            Pmax[pid] = max(Pmax[pid], price)
-        Rmax = max(r for _,_,r in sups) if sups else 1.0
-
-        # Формуємо рядки таблиці
-        rows = ""
-        for pid,qty in items:
-            # кандидати для pid
-            cands = [(sid,price) for sid,pid2,price in prs if pid2==pid]
-            best = None; bestS = -1
-            for sid, price in cands:
-                rating = next(r for sid2,_,r in sups if sid2==sid)
-                S = a1*(price/Pmax[pid]) + a2*(rating/Rmax)
-                if S>bestS:
-                    bestS, best = S,(sid,price)
-            sup_name = next(n for sid2,n,_ in sups if sid2==best[0])
-            prod_name= next(n for pid2,n in prds if pid2==pid)
-            cost = best[1]*qty
-            rows += (
-                f"<tr>"
-                f"<td>{html.escape(prod_name)}</td>"
-                f"<td>{qty:.2f}</td>"
-                f"<td>{html.escape(sup_name)}</td>"
-                f"<td>{best[1]:.2f}</td>"
-                f"<td>{cost:.2f}</td>"
-                "</tr>"
-            )
-
-        start_response("200 OK",[("Content-Type","text/html; charset=utf-8")])
-        body = f"""
-        <h2>Результати тендеру</h2>
-        <table border="1" cellpadding="4">
-          <tr><th>Товар</th><th>К-ть</th><th>Постачальник</th>
-              <th>Ціна</th><th>Вартість</th></tr>
-          {rows}
-        </table>
-        """
-        return [render(body)]
+        global _tender_page
+        conn = get_conn()
+        # Ревізія і рядки читаються з одного знімка БД
+        conn.execute("BEGIN")
+        try:
+            etag = tender_etag(conn)
+            if env.get('HTTP_IF_NONE_MATCH') == etag:
+                start_response("304 Not Modified", [("ETag", etag)])
+                return [b'']
+            cached_etag, page = _tender_page
+            if cached_etag != etag:
+                found = tender_rows(conn)
+            else:
+                found = None
+        finally:
+            conn.commit()
+
+        if found is not None:
+            # Формуємо рядки таблиці
+            rows = []
+            for pid,prod_name,qty,sup_name,price in found:
+                if sup_name is None:
+                    rows.append(
+                        f"<tr><td>{html.escape(prod_name or pid)}</td>"
+                        f"<td>{qty:.2f}</td><td colspan='3'>Немає пропозицій</td></tr>"
+                    )
+                    continue
+                cost = price*qty
+                rows.append(
+                    f"<tr>"
+                    f"<td>{html.escape(prod_name or pid)}</td>"
+                    f"<td>{qty:.2f}</td>"
+                    f"<td>{html.escape(sup_name)}</td>"
+                    f"<td>{price:.2f}</td>"
+                    f"<td>{cost:.2f}</td>"
+                    "</tr>"
+                )
+            rows = "".join(rows)
+            body = f"""
+            <h2>Результати тендеру</h2>
+            <table border="1" cellpadding="4">
+              <tr><th>Товар</th><th>К-ть</th><th>Постачальник</th>
+                  <th>Ціна</th><th>Вартість</th></tr>
+              {rows}
+            </table>
+            """
+            page = render(body)
+            _tender_page = (etag, page)
+
+        start_response("200 OK",[("Content-Type","text/html; charset=utf-8"),
+                                 ("ETag", etag),
+                                 ("Cache-Control", "no-cache")])
+        return [page]
 
     # --- 404 ---
     start_response("404 NOT FOUND",[("Content-Type","text/plain; charset=utf-8")])
     return [b"404 Not Found"]
 
 if __name__=='__main__':
+    init_db()
     print("WSGI-сервер запущено на http://localhost:8051/")
     make_server('',8051,application).serve_forever()
@@ -0,0 +1,200 @@
+# tender_engine.py
+"""
+Вибір найкращого постачальника для товарів тендеру.
+
+Критерій: S = a1*(price/Pmax) + a2*(rating/Rmax), де Pmax — найбільша ціна
+товару серед усіх пропозицій, Rmax — найбільший рейтинг постачальників.
+Перемагає пропозиція з найбільшим S; при рівності — та, що була додана
+раніше (як у старому циклі по таблиці prices).
+
+Переможці зберігаються в таблиці best_offers і підтримуються тригерами на
+prices/suppliers; при зміні coeffs викликається refresh_best(). Лічильник
+revision у tender_meta змінюється при будь-якій зміні даних тендеру і
+служить ETag для сторінки результатів.
+"""
+import sqlite3
+
+# Таблиці, від яких залежить сторінка результатів
+WATCHED_TABLES = ('suppliers', 'products', 'prices', 'coeffs', 'tender_items')
+
+SCHEMA_SQL = """
+CREATE INDEX IF NOT EXISTS idx_prices_product ON prices(product_id, price);
+CREATE TABLE IF NOT EXISTS best_offers (
+  product_id  TEXT PRIMARY KEY,
+  supplier_id TEXT NOT NULL,
+  price       REAL NOT NULL
+);
+"""
+
+META_SQL = """
+CREATE TABLE tender_meta (
+  id       INTEGER PRIMARY KEY CHECK (id = 1),
+  token    TEXT NOT NULL,
+  revision INTEGER NOT NULL
+);
+INSERT INTO tender_meta(id, token, revision)
+VALUES (1, lower(hex(randomblob(8))), 0);
+"""
+
+# Переможці для товарів, що задовольняють {where} (умова над product_id).
+# Без CTE, бо SQLite не дозволяє WITH усередині тригерів; Pmax і Rmax
+# обчислюються один раз на товар / на запит.
+_REFRESH_SQL = """
+DELETE FROM best_offers WHERE {where};
+INSERT INTO best_offers(product_id, supplier_id, price)
+SELECT p.product_id, p.supplier_id, p.price
+FROM (SELECT product_id AS pid, MAX(price) AS pmax
+      FROM prices WHERE {where} GROUP BY product_id) d
+JOIN prices p ON p.rowid = (
+  SELECT rid FROM (
+    SELECT q.rowid AS rid,
+           (SELECT a1 FROM coeffs LIMIT 1) * (q.price / d.pmax)
+         + (SELECT a2 FROM coeffs LIMIT 1)
+           * (s.rating / (SELECT COALESCE(MAX(rating), 1.0) FROM suppliers)) AS score
+    FROM prices q JOIN suppliers s ON s.id = q.supplier_id
+    WHERE q.product_id = d.pid)
+  ORDER BY score DESC, rid
+  LIMIT 1);
+"""
+
+# Повне перерахування одним запитом з віконною функцією (SQLite 3.25+)
+_REFRESH_ALL_SQL = """
+DELETE FROM best_offers;
+INSERT INTO best_offers(product_id, supplier_id, price)
+SELECT product_id, supplier_id, price FROM (
+  SELECT p.product_id, p.supplier_id, p.price,
+         ROW_NUMBER() OVER (
+           PARTITION BY p.product_id
+           ORDER BY k.a1 * (p.price / pm.pmax) + k.a2 * (s.rating / r.rmax) DESC,
+                    p.rowid) AS rn
+  FROM prices p
+  JOIN (SELECT product_id, MAX(price) AS pmax
+        FROM prices GROUP BY product_id) pm ON pm.product_id = p.product_id
+  JOIN suppliers s ON s.id = p.supplier_id
+  CROSS JOIN (SELECT a1, a2 FROM coeffs LIMIT 1) k
+  CROSS JOIN (SELECT COALESCE(MAX(rating), 1.0) AS rmax FROM suppliers) r
+) WHERE rn = 1;
+"""
+
+_TRIGGERS = {
+    # Зміна пропозиції впливає лише на її товар (Pmax теж рахується по товару)
+    'prices_best_ai': ("AFTER INSERT ON prices",
+                       "product_id = NEW.product_id"),
+    'prices_best_au': ("AFTER UPDATE OF supplier_id, product_id, price "
+                       "ON prices",
+                       "product_id IN (OLD.product_id, NEW.product_id)"),
+    'prices_best_ad': ("AFTER DELETE ON prices",
+                       "product_id = OLD.product_id"),
+    # Новий постачальник без рекорду рейтингу змінює лише свої товари,
+    # інакше змінюється Rmax і треба перерахувати все
+    'suppliers_best_ai': (
+        "AFTER INSERT ON suppliers WHEN NEW.rating <= "
+        "(SELECT MAX(rating) FROM suppliers WHERE id <> NEW.id)",
+        "product_id IN (SELECT product_id FROM prices WHERE supplier_id = NEW.id)"),
+    'suppliers_best_ai_rmax': (
+        "AFTER INSERT ON suppliers WHEN NOT NEW.rating <= "
+        "COALESCE((SELECT MAX(rating) FROM suppliers WHERE id <> NEW.id), -1e308)",
+        "1"),
+    'suppliers_best_au': ("AFTER UPDATE OF id, rating ON suppliers", "1"),
+    'suppliers_best_ad': ("AFTER DELETE ON suppliers", "1"),
+}
+
+TENDER_ROWS_SQL = """
+SELECT ti.product_id, pr.name, ti.quantity, s.name, b.price
+FROM tender_items ti
+LEFT JOIN products pr    ON pr.id = ti.product_id
+LEFT JOIN best_offers b  ON b.product_id = ti.product_id
+LEFT JOIN suppliers s    ON s.id = b.supplier_id
+ORDER BY ti.id
+"""
+
+# Віконні функції з'явились у SQLite 3.25
+HAS_WINDOW = sqlite3.sqlite_version_info >= (3, 25, 0)
+
+
+def _triggers_sql():
+    parts = []
+    for name, (event, where) in _TRIGGERS.items():
+        parts.append(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN"
+                     f"{_REFRESH_SQL.format(where=where)}END;")
+    for table in WATCHED_TABLES:
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            parts.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_rev_{op[0].lower()} "
+                f"AFTER {op} ON {table} BEGIN "
+                "UPDATE tender_meta SET revision = revision + 1; END;")
+    return "\n".join(parts)
+
+
+def _trigger_names():
+    return list(_TRIGGERS) + [f"{t}_rev_{op}" for t in WATCHED_TABLES
+                              for op in 'iud']
+
+
+def install(conn):
+    """
+    Створює best_offers, лічильник ревізій і тригери; заповнює best_offers.
+    Якщо тригерів бракує (імпорт упав між suspend() і resume()), best_offers
+    могла застаріти — її теж перераховано.
+    """
+    conn.executescript(SCHEMA_SQL)
+    fresh = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='tender_meta'"
+    ).fetchone() is None
+    if fresh:
+        conn.executescript(META_SQL)
+    existing = {name for name, in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='trigger'")}
+    missing = not existing.issuperset(_trigger_names())
+    conn.executescript(_triggers_sql())
+    if fresh or missing:
+        with conn:
+            refresh_best(conn)
+            conn.execute("UPDATE tender_meta SET revision = revision + 1")
+
+
+def suspend(conn):
+    """
+    Вимикає тригери best_offers і індекс prices на час масового імпорту:
+    замість перерахунку на кожен рядок — один resume() наприкінці (або
+    install(), якщо до resume() справа не дійшла). Тригери ревізії
+    лишаються: зміни, зроблені паралельно з імпортом, теж змінюють ETag.
+    """
+    for name in _TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP INDEX IF EXISTS idx_prices_product")
+    conn.commit()
+
+
+def resume(conn):
+    """Відновлює індекс і тригери, перераховує best_offers і ревізію."""
+    conn.executescript(SCHEMA_SQL)
+    conn.executescript(_triggers_sql())
+    with conn:
+        refresh_best(conn)
+        conn.execute("UPDATE tender_meta SET revision = revision + 1")
+
+
+def refresh_best(conn):
+    """Перераховує переможців для всіх товарів (наприклад, після зміни a1, a2)."""
+    script = _REFRESH_ALL_SQL if HAS_WINDOW else _REFRESH_SQL.format(where="1")
+    # Не executescript(): той завжди робить COMMIT, а тут перерахунок має
+    # потрапити в транзакцію того, хто змінює дані
+    for stmt in script.split(';'):
+        if stmt.strip():
+            conn.execute(stmt)
+
+
+def tender_etag(conn):
+    token, rev = conn.execute(
+        "SELECT token, revision FROM tender_meta").fetchone()
+    return f'"{token}-{rev}"'
+
+
+def tender_rows(conn):
+    """
+    Рядки таблиці результатів у порядку додавання товарів до тендеру:
+    (product_id, product_name, quantity, supplier_name, price).
+    Для товарів без пропозицій supplier_name і price — None.
+    """
+    return conn.execute(TENDER_ROWS_SQL).fetchall()
@@ -1,6 +1,18 @@
 from wsgiref.simple_server import make_server
 from urllib.parse import parse_qs
-import html
+from array import array
+
+import dot_api
+import sessions
+
+# None — сесії в пам'яті процесу; 'sessions.db' — у SQLite
+SESSION_DB = None
+
+store = (sessions.SQLiteSessions(SESSION_DB) if SESSION_DB
+         else sessions.MemorySessions())
+
+# Сховища сесій безпечні для потоків
+WSGI_THREAD_SAFE = True
 
 def render(body: str) -> bytes:
     html_page = (
@@ -14,6 +26,10 @@ def render(body: str) -> bytes:
     return html_page.encode("utf-8")
 
 def application(environ, start_response):
+    # Цілі вектори JSON або float64 — без покрокової форми
+    if environ.get('PATH_INFO') == '/api/dot':
+        return dot_api.application(environ, start_response)
+
     method = environ['REQUEST_METHOD']
     if method == 'GET':
         qs = environ.get('QUERY_STRING','')
@@ -30,72 +46,81 @@ def application(environ, start_response):
         vals = params.get(key)
         return vals[0] if vals else None
 
-    n = g('n')
+    # Введені вектори зберігаються на сервері, у браузері — лише cookie сесії
+    HTML = ("Content-Type","text/html; charset=utf-8")
+    sid = sessions.sid_from(environ)
 
-    if not n:
-        start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-        body = """
-        <h2>Крок 1: Введіть розмір вектора n</h2>
-        <form method="get">
-          n: <input name="n" type="number" min="1" required><br>
-          <input type="submit" value="Далі">
-        </form>
-        """
-        return [render(body)]
+    if method == 'GET':
+        n = g('n')
+        if not n:
+            start_response("200 OK", [HTML])
+            body = """
+            <h2>Крок 1: Введіть розмір вектора n</h2>
+            <form method="get">
+              n: <input name="n" type="number" min="1" required><br>
+              <input type="submit" value="Далі">
+            </form>
+            """
+            return [render(body)]
 
-    try:
-        ni = int(n)
-        assert ni > 0
-    except:
-        start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-        return [render("<p style='color:red;'>Невірне значення n.</p>")]
+        try:
+            ni = int(n)
+            assert ni > 0
+        except:
+            start_response("200 OK", [HTML])
+            return [render("<p style='color:red;'>Невірне значення n.</p>")]
 
-    if g('v1_0') is None:
-        start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-        body = f"<h2>Крок 2: Введіть {ni} компонент(ів) вектора 1</h2>"
-        body += "<form method='post'>"
-        body += f"<input type='hidden' name='n' value='{n}'>"
-        for i in range(ni):
-            body += f"v1_{i}: <input name='v1_{i}' required><br>"
-        body += "<input type='submit' value='Далі'></form>"
-        return [render(body)]
+        if sid:
+            store.delete(sid)
+        sid = store.create({'n': ni})
+        start_response("200 OK", [HTML, sessions.cookie_header(sid, store.ttl)])
+        body = [f"<h2>Крок 2: Введіть {ni} компонент(ів) вектора 1</h2>",
+                "<form method='post'>"]
+        body += [f"v1_{i}: <input name='v1_{i}' required><br>" for i in range(ni)]
+        body.append("<input type='submit' value='Далі'></form>")
+        return [render("".join(body))]
 
+    state = store.get(sid)
+    if state is None:
+        start_response("200 OK", [HTML])
+        return [render("<p style='color:red;'>Сесію не знайдено або вона завершилась.</p>"
+                       "<p><a href='/'>Почати спочатку</a></p>")]
+    ni = state['n']
 
-    if g('v2_0') is None:
+    if g('v1_0') is not None:
         try:
-            v1 = [float(g(f'v1_{i}')) for i in range(ni)]
+            v1 = array('d', (float(g(f'v1_{i}')) for i in range(ni)))
         except:
-            start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
+            start_response("200 OK", [HTML])
             return [render("<p style='color:red;'>Невірні дані вектора 1.</p>")]
+        state['v1'] = v1
+        store.save(sid, state)
 
-        start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-        body = f"<h2>Вектор 1: [{', '.join(f'{x:.3f}' for x in v1)}]</h2>"
-        body += f"<h2>Крок 3: Введіть {ni} компонент(ів) вектора 2</h2>"
-        body += "<form method='post'>"
-        body += f"<input type='hidden' name='n' value='{n}'>"
-
-        for i,x in enumerate(v1):
-            body += f"<input type='hidden' name='v1_{i}' value='{html.escape(str(x))}'>"
-        for i in range(ni):
-            body += f"v2_{i}: <input name='v2_{i}' required><br>"
-        body += "<input type='submit' value='Обчислити'></form>"
-        return [render(body)]
+        start_response("200 OK", [HTML])
+        body = [f"<h2>Вектор 1: [{', '.join(f'{x:.3f}' for x in v1)}]</h2>",
+                f"<h2>Крок 3: Введіть {ni} компонент(ів) вектора 2</h2>",
+                "<form method='post'>"]
+        body += [f"v2_{i}: <input name='v2_{i}' required><br>" for i in range(ni)]
+        body.append("<input type='submit' value='Обчислити'></form>")
+        return [render("".join(body))]
 
+    v1 = state.get('v1')
     try:
-        v1 = [float(g(f'v1_{i}')) for i in range(ni)]
-        v2 = [float(g(f'v2_{i}')) for i in range(ni)]
+        assert v1 is not None
+        v2 = array('d', (float(g(f'v2_{i}')) for i in range(ni)))
     except:
-        start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
+        start_response("200 OK", [HTML])
         return [render("<p style='color:red;'>Невірні дані вектора 2.</p>")]
 
     prod = sum(a*b for a,b in zip(v1, v2))
+    store.delete(sid)
     body = (
         f"<h2>Вектор 1: [{', '.join(f'{x:.3f}' for x in v1)}]</h2>"
         f"<h2>Вектор 2: [{', '.join(f'{x:.3f}' for x in v2)}]</h2>"
         f"<h2>Скалярний добуток: <b>{prod:.3f}</b></h2>"
-        "<p><a href='/' onclick='history.back();return false;'>Почати спочатку</a></p>"
+        "<p><a href='/'>Почати спочатку</a></p>"
     )
-    start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
+    start_response("200 OK", [HTML])
     return [render(body)]
 
 if __name__ == '__main__':
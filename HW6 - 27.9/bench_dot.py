@@ -0,0 +1,82 @@
+# bench_dot.py
+"""
+Пропускна здатність /api/dot.
+
+    python bench_dot.py [--sizes 1000 100000 1000000] [--repeat 5]
+
+Для кожної розмірності n: обчислення (NumPy і чистий Python) та повний
+запит через WSGI-застосунок — двійковий і JSON. Виводить найкращий час
+з --repeat спроб і мільйони елементів векторів за секунду.
+"""
+import argparse
+import io
+import json
+import random
+import time
+from array import array
+
+import dot_api
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+def call(body, ctype, qs=''):
+    env = {'REQUEST_METHOD': 'POST', 'PATH_INFO': '/api/dot',
+           'QUERY_STRING': qs, 'CONTENT_TYPE': ctype,
+           'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+    status = []
+    out = b''.join(dot_api.application(env, lambda s, h: status.append(s)))
+    assert status[0].startswith('200'), out
+    return out
+
+
+def report(name, n_elems, secs):
+    print(f"  {name:<28} {secs * 1e3:10.3f} мс  {n_elems / secs / 1e6:10.1f} млн ел./с")
+
+
+def bench(n, pairs, repeat, python_limit):
+    flat = array('d', (random.random() for _ in range(2 * n * pairs)))
+    body = flat.tobytes()
+    elems = 2 * n * pairs
+    print(f"n={n}, пар={pairs} ({len(body) / 1e6:.1f} МБ)")
+
+    if np is not None:
+        arr = np.frombuffer(body, dtype='<f8')
+        report("NumPy einsum", elems, best(lambda: dot_api.dots_numpy(arr, n), repeat))
+    if elems <= python_limit:
+        report("чистий Python", elems, best(lambda: dot_api.dots_python(flat, n), repeat))
+        doc = json.dumps({'pairs': [[flat[i:i + n].tolist(), flat[i + n:i + 2 * n].tolist()]
+                                    for i in range(0, len(flat), 2 * n)]}).encode()
+        report("WSGI, JSON", elems, best(lambda: call(doc, 'application/json'), repeat))
+    report("WSGI, float64", elems,
+           best(lambda: call(body, 'application/octet-stream', f'n={n}'), repeat))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Бенчмарк /api/dot")
+    ap.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    ap.add_argument('--pairs', type=int, default=1, help="пар векторів в одному запиті")
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--python-limit', type=int, default=2000000,
+                    help="не міряти чистий Python і JSON для більших обсягів")
+    args = ap.parse_args(argv)
+
+    print("NumPy:", np.__version__ if np is not None else "немає (array('d'))")
+    for n in args.sizes:
+        bench(n, args.pairs, args.repeat, args.python_limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# dot_api.py
+"""
+POST /api/dot — скалярні добутки цілих векторів без полів форми.
+
+JSON (Content-Type: application/json):
+    {"a": [...], "b": [...]}           -> {"n": N, "dot": x}
+    {"pairs": [[a1, b1], [a2, b2]]}    -> {"n": N, "dots": [x1, x2]}
+
+Двійковий формат (Content-Type: application/octet-stream): тіло — масив
+float64 little-endian, пари векторів підряд: a1, b1, a2, b2, ...
+Розмірність задає ?n=N; без n тіло — одна пара (a, b) однакової довжини.
+Відповідь — JSON {"n": N, "dots": [...]}, з ?out=bin — float64 little-endian.
+
+Обчислення — NumPy, якщо встановлено; інакше array('d') і чистий Python
+(у десятки разів повільніше, але без залежностей).
+"""
+import json
+import operator
+import sys
+from array import array
+from urllib.parse import parse_qs
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_BYTES = 512 << 20           # 64 млн чисел float64
+READ_CHUNK = 1 << 20
+JSON_TYPES = ('application/json', 'text/json')
+BINARY_TYPES = ('application/octet-stream',)
+
+
+class ApiError(Exception):
+    def __init__(self, status, msg):
+        super().__init__(msg)
+        self.status = status
+
+
+def read_body(environ):
+    """Тіло запиту одним bytearray; розмір відомий наперед з CONTENT_LENGTH."""
+    try:
+        size = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        raise ApiError("411 Length Required", "потрібен Content-Length")
+    if size > MAX_BYTES:
+        raise ApiError("413 Payload Too Large", f"тіло більше {MAX_BYTES} байт")
+    buf = bytearray(size)
+    view = memoryview(buf)
+    src = environ['wsgi.input']
+    pos = 0
+    while pos < size:
+        chunk = src.read(min(READ_CHUNK, size - pos))
+        if not chunk:
+            raise ApiError("400 Bad Request", "тіло коротше за Content-Length")
+        view[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    return buf
+
+
+# --- обчислення ---
+
+def dots_numpy(flat, n):
+    """flat — float64 [a1, b1, a2, b2, ...] з векторами довжини n."""
+    pairs = flat.reshape(-1, 2, n)
+    return np.einsum('ij,ij->i', pairs[:, 0], pairs[:, 1])
+
+
+def dots_python(flat, n):
+    out = array('d')
+    for off in range(0, len(flat), 2 * n):
+        a = flat[off:off + n]
+        b = flat[off + n:off + 2 * n]
+        out.append(sum(map(operator.mul, a, b)))
+    return out
+
+
+def from_bytes(buf):
+    """float64 little-endian -> масив NumPy або array('d')."""
+    if len(buf) % 8:
+        raise ApiError("400 Bad Request", "довжина тіла не кратна 8 байтам")
+    if np is not None:
+        return np.frombuffer(buf, dtype='<f8')
+    flat = array('d')
+    flat.frombytes(buf)
+    if sys.byteorder == 'big':
+        flat.byteswap()
+    return flat
+
+
+def from_lists(pairs):
+    """[[a, b], ...] зі списків JSON -> (плаский масив, n)."""
+    if not pairs:
+        raise ApiError("400 Bad Request", "немає жодної пари векторів")
+    n = len(pairs[0][0])
+    flat = array('d')
+    try:
+        for a, b in pairs:
+            if len(a) != n or len(b) != n:
+                raise ApiError("400 Bad Request", "вектори різної довжини")
+            flat.extend(a)
+            flat.extend(b)
+    except (TypeError, ValueError, OverflowError):
+        # OverflowError — ціле JSON, більше за float64
+        raise ApiError("400 Bad Request", "вектори мають містити лише числа")
+    if np is not None:
+        flat = np.frombuffer(flat, dtype=np.float64)
+    return flat, n
+
+
+def compute(flat, n):
+    if n <= 0 or len(flat) % (2 * n):
+        raise ApiError("400 Bad Request",
+                       f"{len(flat)} чисел не ділиться на пари векторів довжини {n}")
+    if np is not None:
+        return dots_numpy(flat, n)
+    return dots_python(flat, n)
+
+
+def to_bytes(dots):
+    if np is not None:
+        return np.asarray(dots, dtype='<f8').tobytes()
+    out = array('d', dots)
+    if sys.byteorder == 'big':
+        out.byteswap()
+    return out.tobytes()
+
+
+# --- WSGI ---
+
+def handle(environ):
+    """(заголовки, тіло відповіді) або ApiError."""
+    if environ['REQUEST_METHOD'] != 'POST':
+        raise ApiError("405 Method Not Allowed", "лише POST")
+    ctype = environ.get('CONTENT_TYPE', '').split(';')[0].strip().lower()
+    qs = {k: v[0] for k, v in parse_qs(environ.get('QUERY_STRING', '')).items()}
+
+    if ctype in BINARY_TYPES:
+        flat = from_bytes(read_body(environ))
+        try:
+            n = int(qs['n']) if qs.get('n') else len(flat) // 2
+        except ValueError:
+            raise ApiError("400 Bad Request", "n має бути цілим")
+        dots = compute(flat, n)
+        single = False
+    elif ctype in JSON_TYPES:
+        try:
+            data = json.loads(read_body(environ))
+        except ValueError as e:
+            raise ApiError("400 Bad Request", f"невірний JSON: {e}")
+        if not isinstance(data, dict):
+            raise ApiError("400 Bad Request", "очікується JSON-об'єкт")
+        single = 'pairs' not in data
+        pairs = [(data.get('a'), data.get('b'))] if single else data['pairs']
+        try:
+            flat, n = from_lists(pairs)
+        except (TypeError, IndexError, KeyError):
+            raise ApiError("400 Bad Request", "потрібні a і b або pairs")
+        dots = compute(flat, n)
+    else:
+        raise ApiError("415 Unsupported Media Type",
+                       "Content-Type: application/json або application/octet-stream")
+
+    if qs.get('out') == 'bin':
+        return [("Content-Type", "application/octet-stream")], to_bytes(dots)
+    dots = [float(x) for x in dots]
+    result = {'n': n, 'dot': dots[0]} if single else {'n': n, 'dots': dots}
+    try:
+        # inf і nan (з 1e999 у JSON або переповнення) — не JSON
+        body = json.dumps(result, allow_nan=False)
+    except ValueError:
+        raise ApiError("400 Bad Request", "результат не скінченне число; ?out=bin поверне його як є")
+    return [("Content-Type", "application/json")], body.encode('utf-8')
+
+
+def application(environ, start_response):
+    try:
+        headers, body = handle(environ)
+    except ApiError as e:
+        body = json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8')
+        start_response(e.status, [("Content-Type", "application/json; charset=utf-8"),
+                                  ("Content-Length", str(len(body)))])
+        return [body]
+    start_response("200 OK", headers + [("Content-Length", str(len(body)))])
+    return [body]
@@ -0,0 +1,194 @@
+# sessions.py
+"""
+Серверні сесії для покрокових форм.
+
+Дані сесії — словник зі значеннями int/float/str/None та масивами
+array('d'); клієнт отримує лише ідентифікатор у cookie. Сесія живе ttl
+секунд від останнього звернення.
+
+MemorySessions — у пам'яті процесу (найстаріші витісняються понад
+max_items); SQLiteSessions — у файлі SQLite, переживає перезапуск і
+спільна для кількох процесів. Обидва класи безпечні для потоків.
+"""
+import json
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from http.cookies import SimpleCookie
+
+COOKIE_NAME = 'sid'
+TTL = 30 * 60
+MAX_ITEMS = 10000
+
+
+def new_sid():
+    return secrets.token_urlsafe(24)
+
+
+def sid_from(environ):
+    """Ідентифікатор сесії з cookie запиту або None."""
+    cookie = SimpleCookie()
+    try:
+        cookie.load(environ.get('HTTP_COOKIE', ''))
+    except Exception:
+        return None
+    morsel = cookie.get(COOKIE_NAME)
+    return morsel.value if morsel else None
+
+
+def cookie_header(sid, ttl=TTL):
+    return ('Set-Cookie', f"{COOKIE_NAME}={sid}; Max-Age={int(ttl)}; Path=/; "
+                          "HttpOnly; SameSite=Lax")
+
+
+class MemorySessions:
+    def __init__(self, ttl=TTL, max_items=MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items = OrderedDict()     # sid -> (expires, data), старі — спочатку
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        items = self._items
+        while items:
+            sid, (expires, _) = next(iter(items.items()))
+            if expires > now and len(items) <= self.max_items:
+                break
+            del items[sid]
+
+    def get(self, sid):
+        """Дані сесії або None; звернення продовжує життя сесії."""
+        if not sid:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            hit = self._items.get(sid)
+            if hit is None or hit[0] <= now:
+                self._items.pop(sid, None)
+                return None
+            self._items[sid] = (now + self.ttl, hit[1])
+            self._items.move_to_end(sid)
+            return hit[1]
+
+    def save(self, sid, data):
+        now = time.monotonic()
+        with self._lock:
+            self._items[sid] = (now + self.ttl, data)
+            self._items.move_to_end(sid)
+            self._evict(now)
+
+    def create(self, data):
+        sid = new_sid()
+        self.save(sid, data)
+        return sid
+
+    def delete(self, sid):
+        with self._lock:
+            self._items.pop(sid, None)
+
+
+# --- SQLite ---
+
+def _dump(data):
+    """
+    (JSON, BLOB): масиви array('d') ідуть у BLOB підряд як float64
+    little-endian, у JSON на їхньому місці — {'f64': кількість чисел}.
+    """
+    out = {}
+    blob = bytearray()
+    for k, v in data.items():
+        if isinstance(v, array):
+            if sys.byteorder == 'big':
+                v = array('d', v)
+                v.byteswap()
+            blob += v.tobytes()
+            v = {'f64': len(v)}
+        out[k] = v
+    return json.dumps(out), bytes(blob)
+
+
+def _load(text, blob):
+    data = json.loads(text)
+    pos = 0
+    for k, v in data.items():
+        if isinstance(v, dict) and 'f64' in v:
+            arr = array('d')
+            end = pos + 8 * v['f64']
+            arr.frombytes(blob[pos:end])
+            pos = end
+            if sys.byteorder == 'big':
+                arr.byteswap()
+            data[k] = arr
+    return data
+
+
+class SQLiteSessions:
+    SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS sessions (
+      sid     TEXT PRIMARY KEY,
+      expires REAL NOT NULL,
+      data    TEXT NOT NULL,
+      arrays  BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires);
+    """
+    PURGE_EVERY = 100       # чистити прострочені сесії раз на стільки записів
+
+    def __init__(self, db_file, ttl=TTL):
+        self.db_file = db_file
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        conn = sqlite3.connect(db_file)
+        conn.executescript(self.SCHEMA_SQL)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+    def conn(self):
+        # Одне з'єднання на потік сервера
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        if not sid:
+            return None
+        now = time.time()
+        conn = self.conn()
+        row = conn.execute("SELECT data, arrays FROM sessions WHERE sid=? AND expires>?",
+                           (sid, now)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE sessions SET expires=? WHERE sid=?",
+                         (now + self.ttl, sid))
+        return _load(*row)
+
+    def save(self, sid, data):
+        now = time.time()
+        conn = self.conn()
+        with conn:
+            conn.execute("INSERT INTO sessions(sid,expires,data,arrays) VALUES (?,?,?,?) "
+                         "ON CONFLICT(sid) DO UPDATE SET expires=excluded.expires, "
+                         "data=excluded.data, arrays=excluded.arrays",
+                         (sid, now + self.ttl, *_dump(data)))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM sessions WHERE expires<=?", (now,))
+
+    def create(self, data):
+        sid = new_sid()
+        self.save(sid, data)
+        return sid
+
+    def delete(self, sid):
+        conn = self.conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE sid=?", (sid,))
@@ -1,22 +1,59 @@
 # vector_pay_wsgi.py
-import json, os
+import os, sys, json
 from wsgiref.simple_server import make_server
 from urllib.parse import parse_qs
 import html
 from datetime import datetime
 
+from sheet_store import SheetStore
+
+# recordstore.py лежить у корені репозиторію
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recordstore import RecordStore
+
 DRIVERS_FILE = 'drivers.json'
 SHEETS_FILE = 'sheets.json'
+SHEETS_DB = 'sheets.db'
+
+# Маршрутні листи — в SQLite з індексом (водій, дата); sheets.json
+# імпортується під час першого звернення
+sheets = SheetStore(SHEETS_DB, SHEETS_FILE)
+# Водії — журнал дописувань + знімок drivers.json
+drivers = RecordStore(DRIVERS_FILE)
+
+# Обидва сховища безпечні для потоків
+WSGI_THREAD_SAFE = True
+
+# Скільки водіїв показувати у списку вибору; решта знаходиться пошуком
+OPTIONS_LIMIT = 100
+MAX_PAGE = 1000
 
-def load_json(fname):
-    if os.path.exists(fname):
-        with open(fname, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+# Поле пошуку над <select name="driver_id">: перші збіги з /api/drivers
+DRIVER_SEARCH = """
+<input placeholder="пошук водія" autocomplete="off" oninput="searchDrivers(this.value)">
+<script>
+let searchTimer;
+function searchDrivers(q) {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(async () => {
+    const r = await fetch('/api/drivers?q=' + encodeURIComponent(q));
+    const items = (await r.json()).items;
+    document.querySelector('select[name=driver_id]').replaceChildren(
+      ...items.map(d => new Option(d.name, d.id)));
+  }, 200);
+}
+</script>
+"""
 
-def save_json(fname, data):
-    with open(fname, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def name_filter(q):
+    q = (q or '').strip().casefold()
+    if not q:
+        return None
+    return lambda rec: q in rec['name'].casefold()
+
+def driver_options():
+    page, _ = drivers.page(0, OPTIONS_LIMIT)
+    return ''.join([f"<option value='{d['id']}'>{html.escape(d['name'])}</option>" for d in page])
 
 def render(body: str) -> bytes:
     page = (
@@ -94,30 +131,38 @@ def application(environ, start_response):
         except:
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render("<p style='color:red;'>Невірні дані. Спробуйте ще.</p>")]
-        drivers = load_json(DRIVERS_FILE)
-        new_id = max((d['id'] for d in drivers), default=0) + 1
-        drivers.append({
-            'id': new_id,
+        new_id = drivers.insert({
             'name': name,
             'byear': byear_i,
             'rate': rate_f,
             'capacity': cap_f
         })
-        save_json(DRIVERS_FILE, drivers)
         start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
         return [render(f"<p>Водія <b>{html.escape(name)}</b> додано (ID={new_id}).</p>")]
 
+    # --- Пошук водіїв (JSON) ---
+    if path == '/api/drivers':
+        try:
+            after = int(g('after') or 0)
+            limit = min(max(int(g('limit') or OPTIONS_LIMIT), 1), MAX_PAGE)
+        except ValueError:
+            after, limit = 0, OPTIONS_LIMIT
+        page, nxt = drivers.page(after, limit, name_filter(g('q')))
+        data = {'items': [{'id': d['id'], 'name': d['name']} for d in page],
+                'next': nxt}
+        start_response("200 OK", [("Content-Type","application/json; charset=utf-8")])
+        return [json.dumps(data, ensure_ascii=False).encode('utf-8')]
+
     # --- Додати маршрутний лист ---
     if path == '/add_sheet':
-        drivers = load_json(DRIVERS_FILE)
         # GET – форма
         if environ['REQUEST_METHOD'] == 'GET':
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-            opts = ''.join(f"<option value='{d['id']}'>{html.escape(d['name'])}</option>" for d in drivers)
+            opts = driver_options()
             body = f"""
             <h2>Додати маршрутний лист</h2>
             <form method="post">
-              Водій: <select name="driver_id">{opts}</select><br>
+              Водій: {DRIVER_SEARCH}<select name="driver_id">{opts}</select><br>
               Дата (YYYY-MM-DD): <input name="date" required><br>
               Тонно·км: <input name="tonkm" required><br>
               <input type="submit" value="Зберегти">
@@ -132,30 +177,20 @@ def application(environ, start_response):
         except:
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render("<p style='color:red;'>Невірні дані маршрутного листа.</p>")]
-        sheets = load_json(SHEETS_FILE)
-        new_id = max((s['id'] for s in sheets), default=0) + 1
-        sheets.append({
-            'id': new_id,
-            'driver_id': did,
-            'date': date,
-            'tonkm': tonkm
-        })
-        save_json(SHEETS_FILE, sheets)
+        sheets.add(did, date, tonkm)
         start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
         return [render(f"<p>Лист додано для водія ID={did} на {date}.</p>")]
 
     # --- Розрахувати плату ---
     if path == '/calc':
-        drivers = load_json(DRIVERS_FILE)
-        sheets  = load_json(SHEETS_FILE)
         # GET – форма вибору
         if environ['REQUEST_METHOD'] == 'GET':
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-            opts = ''.join(f"<option value='{d['id']}'>{html.escape(d['name'])}</option>" for d in drivers)
+            opts = driver_options()
             body = f"""
             <h2>Розрахунок заробітку водія за період</h2>
             <form method="post">
-              Водій: <select name="driver_id">{opts}</select><br>
+              Водій: {DRIVER_SEARCH}<select name="driver_id">{opts}</select><br>
               Дата з: <input name="from" placeholder="YYYY-MM-DD" required><br>
               Дата по: <input name="to"   placeholder="YYYY-MM-DD" required><br>
               <input type="submit" value="Розрахувати">
@@ -171,20 +206,15 @@ def application(environ, start_response):
         except:
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render("<p style='color:red;'>Невірні дати або водій.</p>")]
-        drv = next((d for d in drivers if d['id']==did), None)
+        drv = drivers.get(did)
         if not drv:
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render("<p style='color:red;'>Водій не знайдений.</p>")]
-        # Фільтруємо маршрутні листи
-        total = 0.0
-        rows = []
-        for s in sheets:
-            if s['driver_id']==did:
-                dt = datetime.fromisoformat(s['date']).date()
-                if d0 <= dt <= d1:
-                    pay = s['tonkm'] * drv['rate']
-                    total += pay
-                    rows.append((s['date'], s['tonkm'], pay))
+        # Листи водія за період — проміжок індексу (driver_id, date)
+        rate = drv['rate']
+        rows = [(date, tonkm, tonkm * rate)
+                for date, tonkm in sheets.period(did, d0, d1)]
+        total = sum(r[2] for r in rows)
         # Формуємо результат
         lines = "".join(f"<tr><td>{r[0]}</td><td>{r[1]}</td><td>{r[2]:.2f}</td></tr>" for r in rows)
         body = f"""
@@ -0,0 +1,82 @@
+# sheet_store.py
+"""
+Сховище маршрутних листів у SQLite.
+
+Листи впорядковані індексом (driver_id, date), тож звіт за період — це
+проміжок індексу, а не перегляд усіх листів. Дати зберігаються у форматі
+YYYY-MM-DD і порівнюються як рядки.
+
+Під час першого відкриття листи переносяться з sheets.json (з тими ж id);
+далі JSON-файл не змінюється.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS sheets (
+  id        INTEGER PRIMARY KEY AUTOINCREMENT,
+  driver_id INTEGER NOT NULL,
+  date      TEXT NOT NULL,
+  tonkm     REAL NOT NULL
+);
+-- tonkm в індексі: звіт читається лише з індексу, без звернень до таблиці
+CREATE INDEX IF NOT EXISTS idx_sheets_driver_date ON sheets(driver_id, date, tonkm);
+"""
+
+
+class SheetStore:
+    def __init__(self, db_file, json_file=None):
+        self.db_file = db_file
+        self.json_file = json_file
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _init(self):
+        with self._init_lock:
+            if self._ready:
+                return
+            conn = sqlite3.connect(self.db_file)
+            conn.executescript(SCHEMA_SQL)
+            conn.execute("PRAGMA journal_mode=WAL")
+            empty = conn.execute("SELECT 1 FROM sheets LIMIT 1").fetchone() is None
+            if empty and self.json_file and os.path.exists(self.json_file):
+                with open(self.json_file, 'r', encoding='utf-8') as f:
+                    sheets = json.load(f)
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO sheets(id,driver_id,date,tonkm) VALUES (?,?,?,?)",
+                        ((s['id'], s['driver_id'], s['date'], s['tonkm'])
+                         for s in sheets))
+            conn.close()
+            self._ready = True
+
+    def conn(self):
+        # Одне з'єднання на потік сервера
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not self._ready:
+                self._init()
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, driver_id, date, tonkm):
+        """Додає лист; повертає його id."""
+        conn = self.conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO sheets(driver_id,date,tonkm) VALUES (?,?,?)",
+                (driver_id, date, tonkm))
+        return cur.lastrowid
+
+    def period(self, driver_id, d0, d1):
+        """Листи водія з d0 по d1 включно: [(date, tonkm)] за зростанням дати."""
+        return self.conn().execute(
+            "SELECT date, tonkm FROM sheets"
+            " WHERE driver_id = ? AND date BETWEEN ? AND ?"
+            " ORDER BY date, id",
+            (driver_id, str(d0), str(d1))).fetchall()
@@ -1,35 +1,118 @@
 
-import os, json, html
+import os, sys, html, codecs, json
 from wsgiref.simple_server import make_server
-from urllib.parse import parse_qs
+from urllib.parse import parse_qs, urlencode
 from datetime import datetime
 
+# recordstore.py лежить у корені репозиторію
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recordstore import RecordStore
+
+from payroll import PayrollIndex
+import timesheet_import
+
 EMP_FILE    = 'employees.json'
 TS_FILE     = 'timesheets.json'
 
-def load(fname):
-    if os.path.exists(fname):
-        with open(fname, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+# Нові записи дописуються в журнал (*.json.log), файли *.json —
+# знімки, що оновлюються під час ущільнення журналу
+employees  = RecordStore(EMP_FILE)
+timesheets = RecordStore(TS_FILE)
+# Години за (місяць, співробітник), оновлюються з кожним новим табелем
+payroll    = PayrollIndex(timesheets)
+
+WSGI_THREAD_SAFE = True
+
+PAGE_SIZE = 100     # співробітників на сторінці за замовчуванням
+MAX_PAGE  = 1000
+CHUNK     = 200     # рядків списку в одному шматку відповіді
+
+PAGE_HEAD = (
+    "<!doctype html><html><head><meta charset='utf-8'>"
+    "<title>Табель і ЗП</title></head><body>"
+    "<nav>"
+      "<a href='/employees'>Співробітники</a> | "
+      "<a href='/timesheet'>Табель</a> | "
+      "<a href='/payroll'>Розрахунок ЗП</a> | "
+      "<a href='/import'>Імпорт табелів</a>"
+    "</nav><hr>"
+).encode('utf-8')
+PAGE_TAIL = b"</body></html>"
 
-def save(fname, data):
-    with open(fname, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# Пошук під час введення: перші збіги з /api/employees передаються в fill()
+SEARCH_JS = """
+<script>
+let searchTimer;
+function searchEmployees(q, fill) {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(async () => {
+    const r = await fetch('/api/employees?q=' + encodeURIComponent(q));
+    fill((await r.json()).items);
+  }, 200);
+}
+</script>
+"""
 
 def render(body: str) -> bytes:
-    page = (
-        "<!doctype html><html><head><meta charset='utf-8'>"
-        "<title>Табель і ЗП</title></head><body>"
-        "<nav>"
-          "<a href='/employees'>Співробітники</a> | "
-          "<a href='/timesheet'>Табель</a> | "
-          "<a href='/payroll'>Розрахунок ЗП</a>"
-        "</nav><hr>"
-        f"{body}"
-        "</body></html>"
-    )
-    return page.encode('utf-8')
+    return PAGE_HEAD + body.encode('utf-8') + PAGE_TAIL
+
+def render_stream(parts):
+    """Як render(), але сторінка віддається шматками з ітератора рядків."""
+    yield PAGE_HEAD
+    for part in parts:
+        yield part.encode('utf-8')
+    yield PAGE_TAIL
+
+def name_filter(q):
+    q = (q or '').strip().casefold()
+    if not q:
+        return None
+    return lambda rec: q in rec['name'].casefold()
+
+def page_args(G):
+    """(after, limit) з параметрів запиту."""
+    try:
+        after = int(G('after') or 0)
+        limit = min(max(int(G('limit') or PAGE_SIZE), 1), MAX_PAGE)
+    except ValueError:
+        after, limit = 0, PAGE_SIZE
+    return after, limit
+
+def employee_list(q, after, limit):
+    yield ("<h2>Список співробітників</h2>"
+           "<form method='get'>Пошук: "
+           f"<input name='q' value='{html.escape(q or '')}' autocomplete='off' "
+           "oninput='searchEmployees(this.value, showEmployees)'>"
+           " <input type='submit' value='Знайти'></form>"
+           "<ul id='emps'>")
+    # Сторінка шукається за курсором, тож час до першого байта
+    # не залежить від кількості співробітників
+    page, nxt = employees.page(after, limit, name_filter(q))
+    for i in range(0, len(page), CHUNK):
+        yield "".join(f"<li>ID {e['id']}: {html.escape(e['name'])}, рік {e['byear']}</li>"
+                      for e in page[i:i+CHUNK])
+    yield "</ul>"
+    if nxt is not None:
+        qs = urlencode({'q': q or '', 'after': nxt, 'limit': limit})
+        yield f"<p id='more'><a href='/employees?{qs}'>Далі &rarr;</a></p>"
+    yield ("<h3>Додати співробітника</h3>"
+           "<form method='post'>"
+           "Прізвище: <input name='name' required><br>"
+           "Рік народження: <input name='byear' type='number' required><br>"
+           "<input type='submit' value='Додати'></form>")
+    yield SEARCH_JS + """
+<script>
+function showEmployees(items) {
+  const ul = document.getElementById('emps');
+  ul.replaceChildren(...items.map(e => {
+    const li = document.createElement('li');
+    li.textContent = `ID ${e.id}: ${e.name}, рік ${e.byear}`;
+    return li;
+  }));
+  const more = document.getElementById('more');
+  if (more) more.remove();
+}
+</script>"""
 
 def get_params(env):
     if env['REQUEST_METHOD']=='GET':
@@ -43,8 +126,66 @@ def get_params(env):
         data = env['wsgi.input'].read(l).decode('utf-8')
         return parse_qs(data, keep_blank_values=True)
 
+def body_lines(env):
+    """Рядки тіла запиту (bytes) по одному: wsgi.input читається не далі CONTENT_LENGTH."""
+    src  = env['wsgi.input']
+    left = int(env.get('CONTENT_LENGTH','0') or 0)
+    while left > 0:
+        line = src.readline(left)
+        if not line:
+            break
+        left -= len(line)
+        yield line
+
+def import_app(env, start_response):
+    if env['REQUEST_METHOD']=='GET':
+        start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
+        # Файл відправляється тілом запиту як є, без multipart
+        b = """
+        <h2>Імпорт табелів (CSV/JSONL)</h2>
+        <p>CSV зі стовпцями emp_id, date, hours або JSONL
+           ({"emp_id": 1, "date": "YYYY-MM-DD", "hours": 8}).</p>
+        <input type="file" id="f" accept=".csv,.jsonl,.ndjson">
+        <label><input type="checkbox" id="strict"> нічого не імпортувати, якщо є помилки</label>
+        <button onclick="send()">Завантажити</button>
+        <pre id="log"></pre>
+        <script>
+        async function send() {
+          const f = document.getElementById('f').files[0];
+          if (!f) return;
+          const strict = document.getElementById('strict').checked ? 1 : 0;
+          const log = document.getElementById('log');
+          log.textContent = '...';
+          const r = await fetch('/import?name=' + encodeURIComponent(f.name) +
+                                '&strict=' + strict, {method: 'POST', body: f});
+          log.textContent = await r.text();
+        }
+        </script>
+        """
+        return [render(b)]
+
+    qs = parse_qs(env.get('QUERY_STRING',''))
+    name   = qs.get('name', [''])[0]
+    strict = qs.get('strict', ['0'])[0] == '1'
+    stream = codecs.iterdecode(body_lines(env), 'utf-8-sig')
+    emp_ids = {e['id'] for e in employees.all()}
+    try:
+        saved, stats = timesheet_import.import_rows(
+            timesheets, timesheet_import.open_rows(stream, name), emp_ids, strict)
+    except ValueError as e:
+        start_response("400 Bad Request", [("Content-Type","text/plain; charset=utf-8")])
+        return [f"Помилка: {e}\n".encode('utf-8')]
+    for sheet in saved:
+        payroll.add(sheet)
+    lines = stats.messages + [f"Готово: {stats}"]
+    start_response("200 OK", [("Content-Type","text/plain; charset=utf-8")])
+    return ["\n".join(lines).encode('utf-8') + b"\n"]
+
 def application(env, start_response):
     path   = env.get('PATH_INFO','/')
+    # Файл імпорту читається потоково, тому до get_params()
+    if path=='/import':
+        return import_app(env, start_response)
     params = get_params(env)
     def G(k):
         v = params.get(k)
@@ -58,12 +199,12 @@ def application(env, start_response):
         b += "<li><a href='/employees'>Управління співробітниками</a></li>"
         b += "<li><a href='/timesheet'>Ввести табель</a></li>"
         b += "<li><a href='/payroll'>Розрахувати ЗП</a></li>"
+        b += "<li><a href='/import'>Імпортувати табелі з файлу</a></li>"
         b += "</ul>"
         return [render(b)]
 
     # --- СПІВРОБІТНИКИ ---
     if path=='/employees':
-        emps = load(EMP_FILE)
         # POST — додаємо нового
         if env['REQUEST_METHOD']=='POST':
             name = G('name')
@@ -74,27 +215,27 @@ def application(env, start_response):
                 msg = "<p style='color:red;'>Помилка даних.</p>"
                 start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
                 return [render(msg)]
-            new_id = max((e['id'] for e in emps), default=0)+1
-            emps.append({'id':new_id,'name':name,'byear':bi})
-            save(EMP_FILE, emps)
+            new_id = employees.insert({'name':name,'byear':bi})
+            start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render(f"<p>Додано {html.escape(name)} (ID={new_id})</p>")]
 
-        # GET — список + форма
+        # GET — сторінка списку + форма, відповідь віддається шматками
         start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-        b = "<h2>Список співробітників</h2><ul>"
-        for e in emps:
-            b += f"<li>ID {e['id']}: {html.escape(e['name'])}, рік {e['byear']}</li>"
-        b += "</ul><h3>Додати співробітника</h3>"
-        b += ("<form method='post'>"
-              "Прізвище: <input name='name' required><br>"
-              "Рік народження: <input name='byear' type='number' required><br>"
-              "<input type='submit' value='Додати'></form>")
-        return [render(b)]
+        after, limit = page_args(G)
+        return render_stream(employee_list(G('q'), after, limit))
+
+    # --- ПОШУК СПІВРОБІТНИКІВ (JSON) ---
+    if path=='/api/employees':
+        after, limit = page_args(G)
+        page, nxt = employees.page(after, limit, name_filter(G('q')))
+        data = {'items': [{'id': e['id'], 'name': e['name'], 'byear': e['byear']}
+                          for e in page],
+                'next': nxt}
+        start_response("200 OK", [("Content-Type","application/json; charset=utf-8")])
+        return [json.dumps(data, ensure_ascii=False).encode('utf-8')]
 
     # --- ТАБЕЛЬ ---
     if path=='/timesheet':
-        emps = load(EMP_FILE)
-        sheets = load(TS_FILE)
         # POST — зберегти табель
         if env['REQUEST_METHOD']=='POST':
             eid    = G('emp_id')
@@ -112,60 +253,69 @@ def application(env, start_response):
                     h = float(hrs)
                     recs.append({'date':d.isoformat(),'hours':h})
             except Exception:
+                start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
                 return [render("<p style='color:red;'>Невірний формат табеля.</p>")]
-            new_id = max((s['id'] for s in sheets), default=0)+1
-            sheets.append({
-                'id': new_id,
+            sheet = {
                 'emp_id': i_emp,
                 'month': month,
                 'records': recs
-            })
-            save(TS_FILE, sheets)
+            }
+            new_id = timesheets.insert(sheet)
+            payroll.add(dict(sheet, id=new_id))
+            start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render(f"<p>Табель збережено (ID={new_id}).</p>")]
 
         # GET — форма введення табеля
         start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
-        opts = "".join(f"<option value='{e['id']}'>{html.escape(e['name'])}</option>" for e in emps)
+        # У списку — перша сторінка, решта знаходиться пошуком
+        page, _ = employees.page(0, PAGE_SIZE)
+        opts = "".join([f"<option value='{e['id']}'>{html.escape(e['name'])}</option>" for e in page])
         b = ("<h2>Ввести табель співробітника</h2>"
              "<form method='post'>"
-             "Співробітник: <select name='emp_id'>" + opts + "</select><br>"
+             "Співробітник: <input placeholder='пошук' autocomplete='off' "
+             "oninput='searchEmployees(this.value, fillEmployees)'> "
+             "<select name='emp_id' id='emp_id'>" + opts + "</select><br>"
              "Місяць (YYYY-MM): <input name='month' required><br>"
              "Табель (рядки у форматі YYYY-MM-DD:години):<br>"
              "<textarea name='entries' rows='8' cols='30'></textarea><br>"
              "<input type='submit' value='Зберегти'></form>")
+        b += SEARCH_JS + """
+<script>
+function fillEmployees(items) {
+  document.getElementById('emp_id').replaceChildren(
+    ...items.map(e => new Option(e.name, e.id)));
+}
+</script>"""
         return [render(b)]
 
     # --- РОЗРАХУНОК ЗП ---
     if path=='/payroll':
-        emps = load(EMP_FILE)
-        sheets = load(TS_FILE)
         # POST — розрахувати за обраний місяць
         if env['REQUEST_METHOD']=='POST':
             month = G('month')
             try:
                 datetime.strptime(month, "%Y-%m")
             except:
+                start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
                 return [render("<p style='color:red;'>Невірний формат місяця.</p>")]
             # для кожного співробітника підсумуємо години та ZP = sum(hours)*rate_per_hour
             # тут беремо ставку як константу, скажімо 50₴/год
             RATE = 50.0
-            b = f"<h2>Розрахунок ЗП за {month}</h2>"
-            b += ("<table border='1' cellpadding='4'>"
-                  "<tr><th>Працівник</th><th>Годин</th><th>Плата, ₴</th></tr>")
-            for e in emps:
-                total_h = sum(
-                    rec['hours']
-                    for s in sheets
-                    if s['emp_id']==e['id'] and s['month']==month
-                    for rec in s['records']
-                )
+            hours = payroll.month(month)
+            parts = [f"<h2>Розрахунок ЗП за {month}</h2>",
+                     "<table border='1' cellpadding='4'>"
+                     "<tr><th>Працівник</th><th>Годин</th><th>Плата, ₴</th></tr>"]
+            for e in employees.all():
+                total_h = hours.get(e['id'], 0.0)
                 pay = total_h * RATE
-                b += ("<tr>"
-                      f"<td>{html.escape(e['name'])}</td>"
-                      f"<td>{total_h:.2f}</td>"
-                      f"<td>{pay:.2f}</td>"
-                      "</tr>")
-            b += "</table>"
+                parts.append("<tr>"
+                             f"<td>{html.escape(e['name'])}</td>"
+                             f"<td>{total_h:.2f}</td>"
+                             f"<td>{pay:.2f}</td>"
+                             "</tr>")
+            parts.append("</table>")
+            b = "".join(parts)
+            start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render(b)]
 
         # GET — вибір місяця
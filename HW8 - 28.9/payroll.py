@@ -0,0 +1,45 @@
+# payroll.py
+"""
+Години співробітників за місяцями: {month: {emp_id: годин}}.
+
+Індекс будується одним проходом по табелях під час першого звернення,
+далі кожен новий табель додається через add(). Розрахунок ЗП за місяць —
+один словник, без перегляду всіх табелів для кожного співробітника.
+"""
+import threading
+
+
+class PayrollIndex:
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._months = None
+        self._upto = 0              # найбільший id табеля, вже врахований
+
+    def _build(self):
+        months = {}
+        upto = 0
+        for s in self.store.all():
+            per_emp = months.setdefault(s['month'], {})
+            per_emp[s['emp_id']] = (per_emp.get(s['emp_id'], 0.0)
+                                    + sum(r['hours'] for r in s['records']))
+            upto = max(upto, s['id'])
+        self._months, self._upto = months, upto
+
+    def add(self, sheet):
+        """Враховує щойно збережений табель."""
+        with self._lock:
+            # До побудови індексу (або якщо табель уже потрапив у неї)
+            # нічого робити не треба
+            if self._months is None or sheet['id'] <= self._upto:
+                return
+            per_emp = self._months.setdefault(sheet['month'], {})
+            per_emp[sheet['emp_id']] = (per_emp.get(sheet['emp_id'], 0.0)
+                                        + sum(r['hours'] for r in sheet['records']))
+
+    def month(self, month):
+        """{emp_id: годин} за місяць YYYY-MM (копія)."""
+        with self._lock:
+            if self._months is None:
+                self._build()
+            return dict(self._months.get(month, {}))
@@ -0,0 +1,273 @@
+# timesheet_import.py
+"""
+Масовий імпорт табелів (вивантаження відділу кадрів).
+
+Файл CSV із заголовком emp_id,date,hours або JSONL — по об'єкту
+{"emp_id": ..., "date": "YYYY-MM-DD", "hours": ...} у рядку. Рядки
+читаються потоково і перевіряються пакетами; рядки з помилками
+пропускаються (з номером рядка в звіті), решта групується в табелі
+(співробітник, місяць) і записується одним insert_many — одне дописування
+в журнал і один fsync на весь файл.
+
+Використання (поки сервер зупинений: журнал пише один процес; під час
+роботи сервера — сторінка /import):
+    python timesheet_import.py export.csv [--strict] [--batch 10000]
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from datetime import date
+from functools import lru_cache
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recordstore import RecordStore
+
+EMP_FILE = 'employees.json'
+TS_FILE = 'timesheets.json'
+BATCH_SIZE = 10000
+MAX_ERRORS = 100
+MAX_HOURS = 24.0
+
+REQUIRED = ('emp_id', 'date', 'hours')
+
+_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}\Z')
+
+
+class ImportStats:
+    __slots__ = ('rows', 'imported', 'sheets', 'errors', 'messages', 'started')
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.sheets = 0
+        self.errors = 0
+        self.messages = []
+        self.started = time.perf_counter()
+
+    def error(self, line, msg):
+        self.errors += 1
+        if len(self.messages) < MAX_ERRORS:
+            self.messages.append(f"рядок {line}: {msg}")
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def __str__(self):
+        return (f"оброблено {self.rows}, імпортовано {self.imported} "
+                f"({self.sheets} табелів), помилок {self.errors}, "
+                f"{self.elapsed:.2f} с")
+
+
+def iter_csv(stream):
+    """(номер рядка, словник) для кожного запису CSV; stream — ітератор рядків тексту."""
+    reader = csv.DictReader(stream)
+    missing = [c for c in REQUIRED if c not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError("Немає стовпців: " + ", ".join(missing))
+    # line_num — рядок файлу, на якому закінчився запис (поле в лапках
+    # може займати кілька рядків)
+    for rec in reader:
+        yield reader.line_num, rec
+
+
+def iter_jsonl(stream):
+    """(номер рядка, словник) для JSONL; нерозібраний рядок — (номер, ValueError)."""
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            rec = json.loads(text)
+            if not isinstance(rec, dict):
+                raise ValueError("очікується об'єкт")
+        except ValueError as e:
+            rec = ValueError(f"невірний JSON ({e})")
+        yield line, rec
+
+
+@lru_cache(maxsize=4096)
+def _month_of(value):
+    """'YYYY-MM-DD' -> 'YYYY-MM'; у вивантаженнях дати повторюються, тож кешуємо."""
+    if not _DATE_RE.match(value):
+        raise ValueError(f"дата {value!r} не у форматі YYYY-MM-DD")
+    date.fromisoformat(value)
+    return value[:7]
+
+
+def _emp_id(value):
+    """Лише ціле: 1.5 чи true з JSON не перетворюються мовчки на 1."""
+    if type(value) in (int, str):
+        return int(value)
+    raise ValueError(f"emp_id {value!r} не є цілим числом")
+
+
+def _hours(value):
+    if isinstance(value, bool):
+        raise ValueError(f"години {value!r} не є числом")
+    return float(value)
+
+
+def _date(value):
+    return str(value).strip()
+
+
+def _column(values, func, lines, bad):
+    """
+    func над стовпцем пакета одним map(); лише якщо в стовпці є помилка,
+    він проходиться по рядках: помилка — в bad[рядок], значення — None.
+    """
+    try:
+        return list(map(func, values))
+    except (TypeError, ValueError):
+        pass
+    out = []
+    for line, value in zip(lines, values):
+        try:
+            out.append(func(value))
+        except (TypeError, ValueError) as e:
+            bad.setdefault(line, e)
+            out.append(None)
+    return out
+
+
+def _check_batch(batch, emp_ids, stats):
+    """
+    Перевіряє пакет рядків по стовпцях; повертає [(emp_id, month, date, hours)].
+    Кожна дата розбирається один раз на пакет; рядок за рядком пакет
+    проходиться, лише якщо в ньому є помилки, — щоб назвати рядки.
+    """
+    if not batch:
+        return []
+    bad = {}    # рядок -> перша помилка в ньому
+    lines, recs = [], []
+    for line, rec in batch:
+        if isinstance(rec, Exception):
+            bad[line] = rec
+            rec = {}
+        lines.append(line)
+        recs.append(rec)
+    # Для стовпців лише з очікуваних типів — вбудовані int, float, strip
+    # (для рядків int() строгий); інакше — перевірка типу кожного значення
+    values = [r.get('emp_id') for r in recs]
+    emps = _column(values, int if set(map(type, values)) <= {int, str} else _emp_id,
+                   lines, bad)
+    values = [r.get('date') for r in recs]
+    days = _column(values, str.strip if set(map(type, values)) == {str} else _date,
+                   lines, bad)
+    months = {}
+    for day in set(days):
+        try:
+            months[day] = _month_of(day)
+        except ValueError as e:
+            months[day] = None
+            for line, d in zip(lines, days):
+                if d == day:
+                    bad.setdefault(line, e)
+    month_col = list(map(months.__getitem__, days))
+    values = [r.get('hours') for r in recs]
+    hours = _column(values, _hours if bool in set(map(type, values)) else float,
+                    lines, bad)
+
+    # nan не проходить порівняння, тож відкидається разом із виходом за межі
+    if (not bad
+            and all(0.0 <= h <= MAX_HOURS for h in hours)
+            and (emp_ids is None or emp_ids.issuperset(emps))):
+        return list(zip(emps, month_col, days, hours))
+
+    good = []
+    for line, emp, month, day, h in zip(lines, emps, month_col, days, hours):
+        if line in bad:
+            stats.error(line, bad[line])
+        elif not 0.0 <= h <= MAX_HOURS:
+            stats.error(line, f"години {h} поза межами 0..{MAX_HOURS:g}")
+        elif emp_ids is not None and emp not in emp_ids:
+            stats.error(line, f"немає співробітника з ID {emp}")
+        else:
+            good.append((emp, month, day, h))
+    return good
+
+
+def collect(rows, emp_ids=None, batch_size=BATCH_SIZE, stats=None):
+    """
+    Перевіряє рядки пакетами і групує їх у табелі.
+    Повертає (список табелів без id, ImportStats).
+    """
+    stats = stats or ImportStats()
+    groups = {}
+
+    def add(batch):
+        for emp, month, day, hours in _check_batch(batch, emp_ids, stats):
+            groups.setdefault((emp, month), []).append({'date': day, 'hours': hours})
+            stats.imported += 1
+
+    batch = []
+    for item in rows:
+        stats.rows += 1
+        batch.append(item)
+        if len(batch) >= batch_size:
+            add(batch)
+            batch = []
+    add(batch)
+
+    sheets = [{'emp_id': emp, 'month': month, 'records': recs}
+              for (emp, month), recs in groups.items()]
+    return sheets, stats
+
+
+def import_rows(store, rows, emp_ids=None, strict=False, batch_size=BATCH_SIZE):
+    """
+    Імпортує рядки в store (RecordStore табелів). З strict=True нічого не
+    записується, якщо є хоч одна помилка. Повертає (збережені табелі з id, stats).
+    """
+    sheets, stats = collect(rows, emp_ids, batch_size)
+    if strict and stats.errors or not sheets:
+        stats.imported = 0
+        return [], stats
+    ids = store.insert_many(sheets)
+    stats.sheets = len(ids)
+    return [dict(s, id=i) for s, i in zip(sheets, ids)], stats
+
+
+def open_rows(stream, name=''):
+    """Рядки текстового потоку: JSONL для *.jsonl / *.ndjson, інакше CSV."""
+    if name.lower().endswith(('.jsonl', '.ndjson')):
+        return iter_jsonl(stream)
+    return iter_csv(stream)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Імпорт табелів з CSV/JSONL")
+    ap.add_argument('file', help="CSV (emp_id,date,hours) або JSONL")
+    ap.add_argument('--timesheets', default=TS_FILE)
+    ap.add_argument('--employees', default=EMP_FILE,
+                    help="для перевірки emp_id; якщо файлу немає — не перевіряється")
+    ap.add_argument('--strict', action='store_true',
+                    help="не імпортувати нічого, якщо є помилки")
+    ap.add_argument('--batch', type=int, default=BATCH_SIZE)
+    args = ap.parse_args(argv)
+
+    emp_ids = None
+    if os.path.exists(args.employees):
+        emp_ids = {e['id'] for e in RecordStore(args.employees).all()}
+    store = RecordStore(args.timesheets)
+    try:
+        with open(args.file, 'r', encoding='utf-8-sig', newline='') as f:
+            _, stats = import_rows(store, open_rows(f, args.file), emp_ids,
+                                   args.strict, args.batch)
+    except ValueError as e:
+        print(f"Помилка: {e}", file=sys.stderr)
+        return 2
+    finally:
+        store.close()
+    for msg in stats.messages:
+        print(msg, file=sys.stderr)
+    print(f"Готово: {stats}")
+    return 0 if stats.imported else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
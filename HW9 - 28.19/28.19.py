@@ -1,83 +1,212 @@
 import os
 import html
 import xml.etree.ElementTree as ET
+from collections import namedtuple
 from wsgiref.simple_server import make_server
 from urllib.parse import parse_qs
 
+from xml_cache import DocCache, locked, write_xml_atomic
+
 SUP_FILE     = 'suppliers.xml'
 PROD_FILE    = 'products.xml'
 PRICE_FILE   = 'prices.xml'
 TENDER_FILE  = 'tender.xml'
 COEFFS_FILE  = 'coeffs.xml'
+# Нові позиції тендеру дописуються сюди, а в tender.xml переносяться
+# пачками по COMPACT_EVERY
+JOURNAL_FILE = 'tender.journal'
+COMPACT_EVERY = 1000
+
+# Більші за це prices.xml не кешуються цілком: /tender читає їх потоково,
+# лише для товарів тендеру
+PRICE_CACHE_LIMIT = 64 * 1024 * 1024
+
+# Записи під блокуванням і атомарні — можна запускати в wsgi_server.py
+WSGI_THREAD_SAFE = True
 
 def ensure_files():
     # Створюємо tender.xml та coeffs.xml, якщо їх нема
     if not os.path.exists(TENDER_FILE):
         root = ET.Element('tender')
-        ET.ElementTree(root).write(TENDER_FILE, encoding='utf-8', xml_declaration=True)
+        write_xml_atomic(root, TENDER_FILE)
     if not os.path.exists(COEFFS_FILE):
         root = ET.Element('coeffs')
         ET.SubElement(root, 'a1').text = '0.5'
         ET.SubElement(root, 'a2').text = '0.5'
-        ET.ElementTree(root).write(COEFFS_FILE, encoding='utf-8', xml_declaration=True)
+        write_xml_atomic(root, COEFFS_FILE)
 
-def load_suppliers():
-    tree = ET.parse(SUP_FILE)
-    out = []
-    for s in tree.getroot().findall('supplier'):
-        out.append({
-            'id':      s.get('id'),
-            'name':    s.findtext('name'),
-            'rating':  float(s.findtext('rating')),
-            'address': s.findtext('address')
-        })
-    return out
+# Компактні записи замість словників (і замість цілого дерева в пам'яті)
+Supplier = namedtuple('Supplier', 'id name rating address')
+Product  = namedtuple('Product', 'id name')
+Price    = namedtuple('Price', 'supplier product price term')
 
-def load_products():
-    tree = ET.parse(PROD_FILE)
-    out = []
-    for p in tree.getroot().findall('product'):
-        out.append({'id': p.get('id'), 'name': p.findtext('name')})
-    return out
+def _iter_records(path, tag):
+    """
+    Потоково віддає елементи tag — прямі нащадки кореня. Оброблені елементи
+    видаляються з кореня, тож у пам'яті тримається лише поточний запис.
+    """
+    depth = 0
+    root = None
+    for event, el in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = el
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1 and el.tag == tag:
+            yield el
+            root.clear()
 
-def load_prices():
-    tree = ET.parse(PRICE_FILE)
-    out = []
-    for pr in tree.getroot().findall('price'):
-        out.append({
-            'supplier': pr.findtext('supplier'),
-            'product':  pr.findtext('product'),
-            'price':    float(pr.findtext('price')),
-            'term':     int(pr.findtext('term'))
-        })
-    return out
+def iter_suppliers(path=SUP_FILE):
+    for s in _iter_records(path, 'supplier'):
+        yield Supplier(s.get('id'), s.findtext('name'),
+                       float(s.findtext('rating')), s.findtext('address'))
 
-def load_tender():
-    tree = ET.parse(TENDER_FILE)
+def iter_products(path=PROD_FILE):
+    for p in _iter_records(path, 'product'):
+        yield Product(p.get('id'), p.findtext('name'))
+
+def iter_prices(path=PRICE_FILE, products=None):
+    """Ціни з prices.xml; products — множина id, решта відкидається одразу."""
+    for pr in _iter_records(path, 'price'):
+        pid = pr.findtext('product')
+        if products is not None and pid not in products:
+            continue
+        yield Price(pr.findtext('supplier'), pid,
+                    float(pr.findtext('price')), int(pr.findtext('term')))
+
+# Розібрані файли кешуються до зміни mtime/розміру у вигляді індексів,
+# тож /tender не шукає записи перебором
+_cache = DocCache()
+
+def _read_suppliers(path):
+    return {'by_id': {s.id: s for s in iter_suppliers(path)}}
+
+def _read_products(path):
+    out = list(iter_products(path))
+    return {'list': out, 'name': {p.id: p.name for p in out}}
+
+def _index_prices(prices):
+    by_product = {}
+    for pr in prices:
+        by_product.setdefault(pr.product, []).append(pr)
+    return {'by_product': by_product}
+
+def _read_prices(path):
+    return _index_prices(iter_prices(path))
+
+def _read_tender(path):
+    tree = ET.parse(path)
+    root = tree.getroot()
     out = []
-    for it in tree.getroot().findall('item'):
+    for it in root.findall('item'):
         out.append({
             'product':  it.get('product'),
             'quantity': float(it.get('quantity'))
         })
+    # upto — номер останнього запису журналу, вже перенесеного у файл
+    return {'items': out, 'upto': int(root.get('upto', 0))}
+
+def _read_journal(path):
+    # Рядок журналу: <item n="номер" product="..." quantity="..." />
+    out = []
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return out
+    with f:
+        for line in f:
+            try:
+                it = ET.fromstring(line)
+                out.append((int(it.get('n')), {
+                    'product':  it.get('product'),
+                    'quantity': float(it.get('quantity'))
+                }))
+            except (ET.ParseError, TypeError, ValueError):
+                # недописаний рядок після збою
+                continue
     return out
 
-def save_tender(items):
-    root = ET.Element('tender')
+def _read_coeffs(path):
+    tree = ET.parse(path)
+    r = tree.getroot()
+    return float(r.findtext('a1')), float(r.findtext('a2'))
+
+# Повернені списки й словники спільні для всіх запитів — не змінювати
+def suppliers_by_id():
+    return _cache.get(SUP_FILE, _read_suppliers)['by_id']
+
+def load_products():
+    return _cache.get(PROD_FILE, _read_products)['list']
+
+def product_names():
+    return _cache.get(PROD_FILE, _read_products)['name']
+
+def prices_by_product(products=None):
+    """
+    Ціни, згруповані за товаром. Великий prices.xml не кешується: його
+    проходимо потоково, відбираючи лише products.
+    """
+    if products is not None and os.path.getsize(PRICE_FILE) > PRICE_CACHE_LIMIT:
+        return _index_prices(iter_prices(PRICE_FILE, set(products)))['by_product']
+    return _cache.get(PRICE_FILE, _read_prices)['by_product']
+
+def load_tender():
+    # Ущільнення замінює tender.xml і чистить журнал двома кроками, а
+    # add_tender_item доповнює кешований список журналу на місці: обидва
+    # файли читаються і результат збирається під блокуванням
+    with locked(TENDER_FILE, shared=True):
+        base = _cache.get(TENDER_FILE, _read_tender)
+        journal = _cache.get(JOURNAL_FILE, _read_journal)
+        return base['items'] + [it for n, it in journal if n > base['upto']]
+
+def add_tender_item(product, quantity):
+    """Дописує позицію в журнал: O(1) незалежно від розміру тендеру."""
+    item = {'product': product, 'quantity': quantity}
+    with locked(TENDER_FILE):
+        base = _cache.get(TENDER_FILE, _read_tender)
+        journal = _cache.get(JOURNAL_FILE, _read_journal)
+        # журнал не довший за COMPACT_EVERY, тож max() тут — стала ціна
+        n = max(base['upto'], max((k for k, _ in journal), default=0)) + 1
+        line = ET.tostring(ET.Element('item', n=str(n), product=product,
+                                      quantity=str(quantity)), encoding='unicode')
+        with open(JOURNAL_FILE, 'a+b') as f:
+            # після збою останній рядок може бути без переводу рядка
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = '\n' + line
+            f.write((line + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        journal.append((n, item))
+        _cache.put(JOURNAL_FILE, journal)
+        if len(journal) >= COMPACT_EVERY:
+            _write_tender(base['items'] +
+                          [it for k, it in journal if k > base['upto']], n)
+
+def _write_tender(items, upto):
+    # Спершу атомарно замінюємо tender.xml (з upto), потім чистимо журнал;
+    # збій між цими кроками не дублює позицій — їх відсіює upto
+    root = ET.Element('tender', upto=str(upto))
     for it in items:
         ET.SubElement(root, 'item', product=it['product'], quantity=str(it['quantity']))
-    ET.ElementTree(root).write(TENDER_FILE, encoding='utf-8', xml_declaration=True)
+    write_xml_atomic(root, TENDER_FILE)
+    _cache.put(TENDER_FILE, {'items': list(items), 'upto': upto})
+    open(JOURNAL_FILE, 'w').close()
+    _cache.put(JOURNAL_FILE, [])
 
 def load_coeffs():
-    tree = ET.parse(COEFFS_FILE)
-    r = tree.getroot()
-    return float(r.findtext('a1')), float(r.findtext('a2'))
+    return _cache.get(COEFFS_FILE, _read_coeffs)
 
 def save_coeffs(a1, a2):
     root = ET.Element('coeffs')
     ET.SubElement(root, 'a1').text = str(a1)
     ET.SubElement(root, 'a2').text = str(a2)
-    ET.ElementTree(root).write(COEFFS_FILE, encoding='utf-8', xml_declaration=True)
+    with locked(COEFFS_FILE):
+        write_xml_atomic(root, COEFFS_FILE)
+        _cache.put(COEFFS_FILE, (float(a1), float(a2)))
 
 def render(body: str) -> bytes:
     html_page = (
@@ -141,7 +270,7 @@ def application(env, start_response):
     if path == '/add_item':
         products = load_products()
         if env['REQUEST_METHOD'] == 'GET':
-            opts = "".join(f"<option value='{p['id']}'>{html.escape(p['name'])}</option>" for p in products)
+            opts = "".join(f"<option value='{p.id}'>{html.escape(p.name)}</option>" for p in products)
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render(f"""
                 <h2>Додати товар до тендеру</h2>
@@ -159,52 +288,53 @@ def application(env, start_response):
         except:
             start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
             return [render("<p style='color:red;'>Невірні дані.</p>")]
-        items = load_tender()
-        items.append({'product': prod, 'quantity': qty_f})
-        save_tender(items)
+        add_tender_item(prod, qty_f)
         start_response("302 Found", [("Location","/add_item")])
         return [b'']
 
     # --- Показати тендер та вибір найкращих постачальників ---
     if path == '/tender':
-        suppliers = load_suppliers()
-        products  = load_products()
-        prices    = load_prices()
+        suppliers = suppliers_by_id()
+        names     = product_names()
         items     = load_tender()
+        by_prod   = prices_by_product({it['product'] for it in items})
         a1,a2     = load_coeffs()
 
-        # Знаходимо Pmax та Rmax
-        from collections import defaultdict
-        Pmax = defaultdict(float)
-        for pr in prices:
-            Pmax[pr['product']] = max(Pmax[pr['product']], pr['price'])
-        Rmax = max(s['rating'] for s in suppliers)
+        # Rmax — по всіх постачальниках, Pmax — по всіх цінах товару
+        Rmax = max((s.rating for s in suppliers.values()), default=1.0)
 
         # Формуємо таблицю
-        rows = ""
+        rows = []
         for it in items:
             pid = it['product']
             qty = it['quantity']
-            # Беремо всі ціни для pid
-            cand = [pr for pr in prices if pr['product']==pid]
+            cand = by_prod.get(pid, [])
+            Pmax = max((pr.price for pr in cand), default=0.0)
             best = None; bestS = -1
             for pr in cand:
-                sup = next(s for s in suppliers if s['id']==pr['supplier'])
-                S = a1*(pr['price']/Pmax[pid]) + a2*(sup['rating']/Rmax)
+                sup = suppliers.get(pr.supplier)
+                if sup is None:
+                    continue
+                S = a1*(pr.price/Pmax) + a2*(sup.rating/Rmax)
                 if S > bestS:
                     bestS = S
                     best = (sup, pr)
-            total = best[1]['price'] * qty
-            pname = next(p['name'] for p in products if p['id']==pid)
-            rows += (
+            pname = names.get(pid, pid)
+            if best is None:
+                rows.append(f"<tr><td>{html.escape(pname)}</td><td>{qty:.2f}</td>"
+                            "<td colspan='3'>Немає пропозицій</td></tr>")
+                continue
+            total = best[1].price * qty
+            rows.append(
                 f"<tr>"
                 f"<td>{html.escape(pname)}</td>"
                 f"<td>{qty:.2f}</td>"
-                f"<td>{html.escape(best[0]['name'])}</td>"
-                f"<td>{best[1]['price']:.2f}</td>"
+                f"<td>{html.escape(best[0].name)}</td>"
+                f"<td>{best[1].price:.2f}</td>"
                 f"<td>{total:.2f}</td>"
                 "</tr>"
             )
+        rows = "".join(rows)
 
         start_response("200 OK", [("Content-Type","text/html; charset=utf-8")])
         return [render(f"""
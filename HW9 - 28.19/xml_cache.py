@@ -0,0 +1,109 @@
+# xml_cache.py
+"""
+Кеш розібраних файлів даних і безпечний запис.
+
+Значення зберігається разом із (mtime, розмір) файлу; поки файл не
+змінився, повторний get() не читає його з диска. Після власного запису
+файлу застосунок кладе нове значення через put(), щоб не розбирати
+щойно записане.
+
+locked() — взаємне виключення записів (між потоками і між процесами),
+з shared=True — спільне блокування для читачів файлів, що змінюються разом;
+write_xml_atomic() — запис через тимчасовий файл і os.replace(), тож
+читач бачить або старий, або новий файл, але не половину.
+"""
+import os
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:                 # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class DocCache:
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, loader):
+        """Значення для path; loader(path) викликається, якщо файл змінився."""
+        sig = _signature(path)
+        with self._lock:
+            hit = self._items.get(path)
+        if hit is not None and sig is not None and hit[0] == sig:
+            return hit[1]
+        value = loader(path)
+        with self._lock:
+            self._items[path] = (sig, value)
+        return value
+
+    def put(self, path, value):
+        """Запам'ятовує value як вміст щойно записаного файлу."""
+        sig = _signature(path)
+        with self._lock:
+            self._items[path] = (sig, value)
+
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def locked(path, shared=False):
+    """
+    Блокування path (через файл path + '.lock'): ексклюзивне або, з
+    shared=True, спільне — для читачів кількох пов'язаних файлів.
+    """
+    if shared and fcntl:
+        # flock розрізняє відкриті файли, тож розділяє й потоки процесу
+        with open(path + '.lock', 'a+b') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    # msvcrt не має спільних блокувань — там і читачі ексклюзивні
+    with _thread_locks_guard:
+        tlock = _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with tlock, open(path + '.lock', 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_xml_atomic(root, path):
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            ET.ElementTree(root).write(f, encoding='utf-8', xml_declaration=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,217 @@
+# recordstore.py
+"""
+Сховище записів з числовими id для JSON-застосунків репозиторію.
+
+Файли для path='employees.json':
+  employees.json       — знімок: JSON-список записів (той самий формат, що й раніше);
+  employees.json.log   — журнал: по JSON-рядку на кожен запис після знімка;
+  employees.json.meta  — {"next_id": N}, наступний id на момент знімка.
+
+Новий запис лише дописується в журнал — O(1), без переписування всього
+файлу. Кожні compact_every записів журнал зливається в новий знімок
+(тимчасовий файл + fsync + os.replace), тому збій посеред запису не псує
+знімок, а недописаний останній рядок журналу просто пропускається.
+
+Запуск не читає знімок: наступний id береться з .meta і короткого журналу,
+а самі записи завантажуються під час першого звернення до них.
+
+page() віддає записи сторінками за курсором (id останнього показаного
+запису): пошук початку сторінки — бінарний, за відсортованим списком id.
+
+Політика fsync журналу: 'always' — після кожного запису, 'interval' — не
+частіше ніж раз на fsync_interval секунд, 'never' — на розсуд ОС.
+Сховище безпечне для потоків одного процесу.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+def _write_atomic(path, text):
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=folder)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class RecordStore:
+    def __init__(self, path, fsync='always', fsync_interval=1.0,
+                 compact_every=10000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync: одне з {FSYNC_POLICIES}")
+        self.path = path
+        self.log_path = path + '.log'
+        self.meta_path = path + '.meta'
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self._lock = threading.RLock()
+        self._records = None            # id -> запис; None — ще не завантажено
+        self._ids = None                # id за зростанням
+        self._log = None
+        self._last_sync = 0.0
+        self._next_id, self._log_count = self._read_counter()
+
+    # --- запуск ---
+
+    def _read_log(self):
+        """Записи журналу; недописаний після збою рядок пропускається."""
+        out = []
+        try:
+            f = open(self.log_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return out
+        with f:
+            for line in f:
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    continue
+        return out
+
+    def _read_counter(self):
+        log = self._read_log()
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                next_id = json.load(f)['next_id']
+        except (FileNotFoundError, ValueError, KeyError):
+            # Файл ще не знає про .meta (старий формат) — рахуємо один раз
+            self._load()
+            next_id = max(self._records, default=0) + 1
+            _write_atomic(self.meta_path, json.dumps({'next_id': next_id}))
+        for rec in log:
+            next_id = max(next_id, rec['id'] + 1)
+        return next_id, len(log)
+
+    def _load(self):
+        if self._records is not None:
+            return
+        records = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for rec in json.load(f):
+                    records[rec['id']] = rec
+        # Повторне застосування журналу безпечне: запис з тим самим id
+        # просто перезаписується
+        for rec in self._read_log():
+            records[rec['id']] = rec
+        ids = sorted(records)
+        if ids != list(records):
+            records = {rid: records[rid] for rid in ids}
+        self._records, self._ids = records, ids
+
+    # --- читання ---
+
+    def all(self):
+        """Усі записи в порядку id."""
+        with self._lock:
+            self._load()
+            return list(self._records.values())
+
+    def get(self, rid):
+        with self._lock:
+            self._load()
+            return self._records.get(rid)
+
+    def page(self, after=0, limit=50, match=None):
+        """
+        До limit записів з id > after за зростанням id; match(запис) — фільтр.
+        Повертає (записи, курсор наступної сторінки або None).
+        """
+        with self._lock:
+            self._load()
+            ids, records = self._ids, self._records
+            out = []
+            for i in range(bisect.bisect_right(ids, after), len(ids)):
+                rec = records[ids[i]]
+                if match is None or match(rec):
+                    if len(out) == limit:
+                        return out, out[-1]['id']
+                    out.append(rec)
+            return out, None
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._records)
+
+    # --- запис ---
+
+    def insert(self, record):
+        """Додає запис, призначає йому id і повертає цей id."""
+        return self.insert_many([record])[0]
+
+    def insert_many(self, records):
+        """Кілька записів одним дописуванням у журнал (і одним fsync)."""
+        with self._lock:
+            out, lines = [], []
+            for rec in records:
+                rec = {'id': self._next_id, **rec}
+                self._next_id += 1
+                out.append(rec)
+                lines.append(json.dumps(rec, ensure_ascii=False))
+            if not out:
+                return []
+            self._append('\n'.join(lines) + '\n')
+            if self._records is not None:
+                for rec in out:
+                    self._records[rec['id']] = rec
+                    self._ids.append(rec['id'])
+            self._log_count += len(out)
+            if self._log_count >= self.compact_every:
+                self.compact()
+            return [rec['id'] for rec in out]
+
+    def _append(self, text):
+        if self._log is None:
+            self._log = open(self.log_path, 'a', encoding='utf-8')
+            # після збою останній рядок журналу може бути без '\n'
+            if self._log.tell():
+                with open(self.log_path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        text = '\n' + text
+        self._log.write(text)
+        self._log.flush()
+        now = time.monotonic()
+        if (self.fsync == 'always' or
+                self.fsync == 'interval' and now - self._last_sync >= self.fsync_interval):
+            os.fsync(self._log.fileno())
+            self._last_sync = now
+
+    def compact(self):
+        """Зливає журнал у новий знімок і очищає журнал."""
+        with self._lock:
+            self._load()
+            # По запису в рядку: файл читабельний, а json.dumps без indent
+            # працює через C-кодувальник у рази швидше
+            _write_atomic(self.path, '[\n' + ',\n'.join(
+                json.dumps(rec, ensure_ascii=False)
+                for rec in self._records.values()) + '\n]\n')
+            _write_atomic(self.meta_path, json.dumps({'next_id': self._next_id}))
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            open(self.log_path, 'w').close()
+            self._log_count = 0
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._log.close()
+                self._log = None
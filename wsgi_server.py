@@ -0,0 +1,334 @@
+# wsgi_server.py
+"""
+Багатопотоковий сервер для WSGI-застосунків репозиторію.
+
+Замість make_server(...).serve_forever(), що обслуговує один запит за раз:
+
+    python wsgi_server.py "HW11 - 29.21/tender_db_wsgi.py" --port 8051 --workers 16
+
+Запити обробляє пул потоків; з'єднання, що не вміщаються в пул і чергу,
+отримують 503. Підтримується HTTP/1.1 keep-alive, SIGINT/SIGTERM дають
+дочекатися запитів, що вже виконуються.
+
+Застосунки, які не оголошують WSGI_THREAD_SAFE = True, обгортаються
+блокуванням читач/письменник: GET/HEAD виконуються паралельно, решта
+запитів (зміни файлів) — по одному.
+"""
+import argparse
+import importlib.util
+import os
+import select
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, ServerHandler
+
+WORKERS = 8
+QUEUE_SIZE = 64
+KEEPALIVE = 5.0
+# Скільки непрочитаного тіла запиту дочитати, щоб зберегти з'єднання
+DRAIN_LIMIT = 1 << 20
+
+BUSY_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                 b"Content-Type: text/plain; charset=utf-8\r\n"
+                 b"Content-Length: 12\r\nRetry-After: 1\r\n"
+                 b"Connection: close\r\n\r\nServer busy\n")
+
+
+class RWLock:
+    """Блокування з пріоритетом письменників."""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class _Locked:
+    """Відповідь застосунку, що тримає блокування до close()."""
+    def __init__(self, result, release):
+        self.result = result
+        self.release = release
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def close(self):
+        try:
+            if hasattr(self.result, 'close'):
+                self.result.close()
+        finally:
+            release, self.release = self.release, None
+            if release:
+                release()
+
+
+def serialize_writes(app):
+    """GET/HEAD — паралельно, інші методи — ексклюзивно."""
+    lock = RWLock()
+
+    def locked_app(environ, start_response):
+        if environ['REQUEST_METHOD'] in ('GET', 'HEAD'):
+            acquire, release = lock.acquire_read, lock.release_read
+        else:
+            acquire, release = lock.acquire_write, lock.release_write
+        acquire()
+        try:
+            result = app(environ, start_response)
+        except BaseException:
+            release()
+            raise
+        return _Locked(result, release)
+
+    return locked_app
+
+
+class _Input:
+    """wsgi.input, обмежений Content-Length; залишок дочитується після відповіді."""
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.left = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.left:
+            size = self.left
+        data = self.rfile.read(size) if size else b''
+        self.left -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.left:
+            size = self.left
+        data = self.rfile.readline(size) if size else b''
+        self.left -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def drain(self):
+        if self.left > DRAIN_LIMIT:
+            return False
+        while self.left:
+            if not self.read(min(self.left, 1 << 16)):
+                return False
+        return True
+
+
+class _KeepAliveServerHandler(ServerHandler):
+    http_version = "1.1"
+    reusable = False
+
+    def cleanup_headers(self):
+        super().cleanup_headers()
+        sized = ('Content-Length' in self.headers
+                 or self.status[:3] in ('204', '304'))
+        server = self.request_handler.server
+        # Коли інші з'єднання чекають на потік, клієнта попереджають заздалегідь
+        self.reusable = (sized and not self.request_handler.close_connection
+                         and not server.pending and not server.stopping)
+        if not self.reusable:
+            self.headers['Connection'] = 'close'
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        self.timeout = self.server.keepalive
+        super().setup()
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one()
+        while not self.close_connection and self.wait_next():
+            self.handle_one()
+
+    def wait_next(self):
+        """
+        Чекає наступний запит на з'єднанні. Потік не простоює на тихому
+        з'єднанні, коли інші з'єднання чекають у черзі або сервер зупиняється.
+        """
+        # Наступний запит міг уже потрапити в буфер rfile
+        self.connection.setblocking(False)
+        try:
+            if self.rfile.peek(1):
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+        deadline = time.monotonic() + self.server.keepalive
+        while not self.server.stopping and not self.server.pending:
+            ready, _, _ = select.select([self.connection], [], [], 0.05)
+            if ready:
+                return True
+            if time.monotonic() >= deadline:
+                break
+        return False
+
+    def handle_one(self):
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except OSError:                 # тайм-аут або розрив з'єднання
+            self.close_connection = True
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        if self.headers.get('Transfer-Encoding'):
+            # Тіло без Content-Length не вміємо пропустити — з'єднання не повторюємо
+            self.close_connection = True
+
+        env = self.get_environ()
+        body = _Input(self.rfile, int(env.get('CONTENT_LENGTH') or 0))
+        handler = _KeepAliveServerHandler(
+            body, self.wfile, self.get_stderr(), env, multithread=True)
+        handler.request_handler = self      # для журналу
+        handler.run(self.server.get_app())
+        if not handler.reusable or not body.drain():
+            self.close_connection = True
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGIServer, що передає з'єднання пулу потоків з обмеженою чергою."""
+    request_queue_size = 128
+    allow_reuse_address = True
+
+    def __init__(self, address, workers=WORKERS, queue_size=QUEUE_SIZE,
+                 keepalive=KEEPALIVE, handler=KeepAliveHandler):
+        super().__init__(address, handler)
+        self.keepalive = keepalive
+        self.stopping = False
+        self.pending = 0                # прийняті, але ще не взяті в роботу
+        self._pending_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='wsgi')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def process_request(self, request, client_address):
+        if self.stopping or not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        with self._pending_lock:
+            self.pending += 1
+        self._pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        with self._pending_lock:
+            self.pending -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        self.stopping = True
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+def load_app(path):
+    """
+    Завантажує application з файлу застосунку. Робочий каталог і sys.path
+    переводяться в каталог файлу: застосунки відкривають дані за відносними
+    шляхами і імпортують сусідні модулі.
+    """
+    path = os.path.abspath(path)
+    folder = os.path.dirname(path)
+    os.chdir(folder)
+    sys.path.insert(0, folder)
+    spec = importlib.util.spec_from_file_location('wsgi_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def serve(app, host='', port=8051, workers=WORKERS, queue_size=QUEUE_SIZE,
+          keepalive=KEEPALIVE):
+    """Запускає app і повертається після SIGINT/SIGTERM, дочекавшись запитів."""
+    server = PooledWSGIServer((host, port), workers, queue_size, keepalive)
+    server.set_app(app)
+
+    def stop(signum, frame):
+        server.stopping = True
+        # shutdown() чекає завершення serve_forever, тому з іншого потоку
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Багатопотоковий WSGI-сервер")
+    ap.add_argument('app', help="файл застосунку з функцією application")
+    ap.add_argument('--host', default='')
+    ap.add_argument('--port', type=int, default=8051)
+    ap.add_argument('--workers', type=int, default=WORKERS)
+    ap.add_argument('--queue', type=int, default=QUEUE_SIZE,
+                    help="скільки з'єднань може чекати на вільний потік")
+    ap.add_argument('--keepalive', type=float, default=KEEPALIVE,
+                    help="тайм-аут простою keep-alive, с")
+    args = ap.parse_args(argv)
+
+    module = load_app(args.app)
+    app = module.application
+    if not getattr(module, 'WSGI_THREAD_SAFE', False):
+        app = serialize_writes(app)
+
+    print(f"WSGI-сервер ({args.workers} потоків) запущено на "
+          f"http://localhost:{args.port}/")
+    serve(app, args.host, args.port, args.workers, args.queue, args.keepalive)
+
+
+if __name__ == '__main__':
+    main()